@@ -0,0 +1,12 @@
+from django.db.models import Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+
+def subquery(queryset, field, aggregate):
+    # `aggregate` over `queryset` grouped by `field`, for correlating with OuterRef
+    return Subquery(queryset.values(field).annotate(total=aggregate).values('total'))
+
+
+def latest(first, second):
+    # Greatest() is NULL on SQLite as soon as one side is, so each side falls back to the other
+    return Greatest(Coalesce(first, second), Coalesce(second, first))
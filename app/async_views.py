@@ -0,0 +1,150 @@
+import base64
+import binascii
+from datetime import datetime
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Q
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.views import View
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from .cache import cached_response
+from .events import topic_event_stream
+from .fragments import render_thread
+from .likes import liked_comment_ids
+from .models import Topic, Comment
+from .serializers import TopicSerializer, TopicSummarySerializer
+
+PAGE_SIZE = 4
+
+
+def encode_cursor(topic):
+    return base64.urlsafe_b64encode(f'{topic.created_at.isoformat()}|{topic.pk}'.encode()).decode()
+
+
+def decode_cursor(value):
+    try:
+        created_at, pk = base64.urlsafe_b64decode(value.encode()).decode().rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        return None
+
+
+async def fetch_topic(pk):
+    try:
+        return await Topic.objects.for_detail().aget(pk=pk)
+    except Topic.DoesNotExist:
+        raise Http404
+
+
+async def fetch_comments(topic_id):
+    queryset = Comment.objects.with_thread_data().filter(topic_id=topic_id).order_by('posted_at')
+    return [comment async for comment in queryset]
+
+
+async def fetch_news():
+    queryset = Topic.objects.for_listing().filter(category_id=settings.NEWS_CATEGORY_ID).order_by('-created_at')[:2]
+    return [topic async for topic in queryset]
+
+
+async def fetch_topic_page(category_pk, cursor):
+    queryset = Topic.objects.for_listing().order_by('-created_at', '-id')
+    if category_pk is not None:
+        queryset = queryset.filter(category_id=category_pk)
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        created_at, pk = position
+        queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+    # One extra row tells whether there is a next page without a COUNT
+    return [topic async for topic in queryset[:PAGE_SIZE + 1]]
+
+
+def authenticate(request):
+    # DRF's authenticators, run outside a DRF view, then the session login; None for anonymous readers
+    for authenticator in api_settings.DEFAULT_AUTHENTICATION_CLASSES:
+        result = authenticator().authenticate(request)
+        if result is not None:
+            return result[0]
+    return request.user if request.user.is_authenticated else None
+
+
+def render(request, template_name, context):
+    return render_to_string(template_name, context, request=request)
+
+
+class AsyncTopicListView(View):
+
+    async def get(self, request, category_pk=None):
+        if category_pk is None:
+            topics = await fetch_topic_page(None, None)
+            topics, next_link = topics[:PAGE_SIZE], None
+        else:
+            topics = await fetch_topic_page(category_pk, request.GET.get('cursor'))
+            next_link = None
+            if len(topics) > PAGE_SIZE:
+                topics = topics[:PAGE_SIZE]
+                next_link = replace_query_param(request.build_absolute_uri(), 'cursor', encode_cursor(topics[-1]))
+        context = {'topics': TopicSummarySerializer(topics, many=True).data, 'links': {'next': next_link}}
+        return HttpResponse(render(request, 'topic_list.html', context))
+
+
+class AsyncTopicDetailView(View):
+
+    async def get(self, request, pk):
+        topic = await fetch_topic(pk)
+        return HttpResponse(render(request, 'topic.html', TopicSerializer(topic).data))
+
+
+class AsyncLatestNewsView(View):
+
+    async def get(self, request):
+        topics = await fetch_news()
+        return HttpResponse(render(request, 'latest_news.html', {'topics': TopicSummarySerializer(topics, many=True).data}))
+
+
+class AsyncCommentsView(View):
+
+    # Same as CommentsView: signed-in readers see their own likes, everyone else shares a cached thread
+    async def get(self, request, topic_id):
+        try:
+            user = await sync_to_async(authenticate)(request)
+        except AuthenticationFailed as exc:
+            return HttpResponse(str(exc.detail), status=exc.status_code)
+        if user is None and 'HTTP_AUTHORIZATION' not in request.META:
+            return await cached_response(type(self).__name__, [f'comments:{topic_id}'], request,
+                                         lambda: self.thread(topic_id))
+        liked = await sync_to_async(liked_comment_ids)(user, topic_id) if user else frozenset()
+        return await self.thread(topic_id, liked)
+
+    async def thread(self, topic_id, liked_ids=frozenset()):
+        return HttpResponse(render_thread(await fetch_comments(topic_id), liked_ids))
+
+
+class AsyncTopicPageView(View):
+
+    async def get(self, request, pk):
+        # Awaited one after another: the async ORM runs every query on the same thread-sensitive
+        # executor, so gathering them would not overlap anything
+        topic = await fetch_topic(pk)
+        comments = await fetch_comments(pk)
+        news = await fetch_news()
+        return HttpResponse(''.join([
+            render(request, 'topic.html', TopicSerializer(topic).data),
+            render_thread(comments),
+            render(request, 'latest_news.html', {'topics': TopicSummarySerializer(news, many=True).data}),
+        ]))
+
+
+class TopicEventsView(View):
+
+    async def get(self, request, topic_id):
+        if not await Topic.objects.filter(pk=topic_id).aexists():
+            raise Http404
+        response = StreamingHttpResponse(topic_event_stream(topic_id), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
@@ -0,0 +1,147 @@
+import threading
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication, JWTStatelessUserAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from .models import CustomUser
+
+# Attributes a token can't carry; ClaimsUser loads the full user for these
+MODEL_ONLY_FIELDS = frozenset({
+    'email', 'profile_picture', 'avatar_variants', 'first_name', 'last_name', 'date_joined', 'last_login',
+})
+
+
+def revocation_cache():
+    return caches[settings.AUTH_REVOCATION_CACHE_ALIAS]
+
+
+def add_user_claims(token, user):
+    token['username'] = user.username
+    token['rating'] = str(user.rating)
+    # Always written: access tokens copy the refresh token's claims, so a stale True would survive a demotion
+    token['is_staff'] = user.is_staff
+    return token
+
+
+def revoke_token(token):
+    remaining = int(token['exp'] - time.time())
+    if remaining > 0:
+        revocation_cache().set(f'revoked-token:{token[api_settings.JTI_CLAIM]}', True, remaining)
+
+
+def revoke_user(user_id):
+    # Every token issued before this second stops working; refresh tokens are the longest lived
+    timeout = int(api_settings.REFRESH_TOKEN_LIFETIME.total_seconds())
+    revocation_cache().set(f'revoked-user:{user_id}', int(time.time()), timeout)
+    user_cache.evict(user_id)
+
+
+def is_revoked(token):
+    token_key = f'revoked-token:{token.get(api_settings.JTI_CLAIM)}'
+    user_key = f'revoked-user:{token.get(api_settings.USER_ID_CLAIM)}'
+    revoked = revocation_cache().get_many([token_key, user_key])
+    return token_key in revoked or (user_key in revoked and token.get('iat', 0) < revoked[user_key])
+
+
+class UserCache:
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def get(self, user_id):
+        entry = self.entries.get(user_id)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        user = CustomUser.objects.get(pk=user_id)
+        with self.lock:
+            if len(self.entries) >= settings.AUTH_USER_CACHE_SIZE:
+                self.entries.pop(next(iter(self.entries)))
+            self.entries[user_id] = (time.monotonic() + settings.AUTH_USER_CACHE_TTL, user)
+        return user
+
+    def evict(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+
+user_cache = UserCache()
+
+
+# The request user in 'claims' mode: id, username, rating and staff flag come from the token,
+# so authenticating costs no queries. The rating is a snapshot taken when the access token
+# was issued. Anything else loads the full user through the short-lived user_cache.
+class ClaimsUser(TokenUser):
+    @cached_property
+    def username(self):
+        return self.token.get('username') or self.user.username
+
+    @cached_property
+    def rating(self):
+        rating = self.token.get('rating')
+        return Decimal(rating) if rating is not None else self.user.rating
+
+    @cached_property
+    def user(self):
+        return user_cache.get(self.id)
+
+    def to_model(self):
+        # For foreign keys and display only; it holds just the claims and must never be saved
+        return CustomUser(id=self.id, username=self.username, rating=self.rating, is_staff=self.is_staff)
+
+    def __getattr__(self, attr):
+        if attr in MODEL_ONLY_FIELDS:
+            return getattr(self.user, attr)
+        return super().__getattr__(attr)
+
+
+def model_user(user):
+    return user.to_model() if isinstance(user, ClaimsUser) else user
+
+
+class RevocationMixin:
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if is_revoked(token):
+            raise InvalidToken('Token has been revoked')
+        return token
+
+
+class ClaimsJWTAuthentication(RevocationMixin, JWTStatelessUserAuthentication):
+    pass
+
+
+class DatabaseJWTAuthentication(RevocationMixin, JWTAuthentication):
+    pass
+
+
+class ForumRefreshToken(RefreshToken):
+    @classmethod
+    def for_user(cls, user):
+        return add_user_claims(super().for_user(user), user)
+
+
+class ForumTokenObtainPairSerializer(TokenObtainPairSerializer):
+    token_class = ForumRefreshToken
+
+
+class ForumTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        if is_revoked(refresh):
+            raise InvalidToken('Token has been revoked')
+        data = super().validate(attrs)
+        # Refreshing is the one place the claims are brought up to date
+        user = CustomUser.objects.filter(pk=refresh[api_settings.USER_ID_CLAIM], is_active=True).first()
+        if user is None:
+            raise InvalidToken('User not found')
+        data['access'] = str(add_user_claims(AccessToken(data['access']), user))
+        return data
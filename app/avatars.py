@@ -0,0 +1,110 @@
+import hashlib
+import io
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.db.models import Q
+from django.urls import reverse
+from PIL import Image, ImageOps
+
+from .auth import user_cache
+from .models import CustomUser
+
+logger = logging.getLogger(__name__)
+
+VARIANT_NAME = re.compile(r'^[0-9a-f]{20}-\d+\.webp$')
+
+
+def too_many_pixels(image):
+    return image.width * image.height > settings.AVATAR_MAX_PIXELS
+
+
+def render_variants(data, sizes, quality):
+    with Image.open(io.BytesIO(data)) as original:
+        # Only the header has been read so far; decoding is what costs memory
+        if too_many_pixels(original):
+            raise ValueError(f'{original.width}x{original.height} is over AVATAR_MAX_PIXELS')
+        image = ImageOps.exif_transpose(original)
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+        shortest = min(image.size)
+        variants = {}
+        for size in sizes:
+            # Square crops, never scaled up past the original
+            side = min(size, shortest)
+            buffer = io.BytesIO()
+            ImageOps.fit(image, (side, side), Image.LANCZOS).save(buffer, 'WEBP', quality=quality, method=4)
+            variants[size] = (side, buffer.getvalue())
+    return variants
+
+
+def store_variant(data, side):
+    digest = hashlib.sha256(data).hexdigest()[:20]
+    name = f'{settings.AVATAR_DIR}/{digest}-{side}.webp'
+    # Content-addressed, so an existing file is already the right one
+    if not default_storage.exists(name):
+        saved = default_storage.save(name, ContentFile(data))
+        # Another job wrote the same file in between and storage picked a free name for this copy
+        if saved != name:
+            default_storage.delete(saved)
+    return name
+
+
+def process_avatar(user_id):
+    user = CustomUser.objects.only('id', 'profile_picture').get(pk=user_id)
+    source = user.profile_picture.name or None
+    variants = {}
+    if source:
+        with user.profile_picture.open('rb') as f:
+            data = f.read()
+        variants['source'] = source
+        for size, (side, content) in render_variants(data, settings.AVATAR_SIZES, settings.AVATAR_QUALITY).items():
+            variants[str(size)] = store_variant(content, side)
+
+    # A picture replaced while this one was processing gets its own job
+    unchanged = Q(profile_picture=source) if source else Q(profile_picture='') | Q(profile_picture__isnull=True)
+    CustomUser.objects.filter(unchanged, pk=user_id).update(avatar_variants=variants)
+    user_cache.evict(user_id)
+    return variants
+
+
+def run_job(user_id):
+    try:
+        process_avatar(user_id)
+    except Exception:
+        logger.exception('Generating avatar variants for user %s failed', user_id)
+    finally:
+        connection.close()
+
+
+@lru_cache(maxsize=None)
+def worker_pool():
+    return ThreadPoolExecutor(max_workers=settings.AVATAR_WORKERS, thread_name_prefix='avatars')
+
+
+def schedule(user_id):
+    if settings.AVATAR_WORKERS:
+        worker_pool().submit(run_job, user_id)
+    else:
+        process_avatar(user_id)
+
+
+def needs_processing(user):
+    return (user.profile_picture.name or None) != (user.avatar_variants or {}).get('source')
+
+
+# The smallest variant at least `size` pixels wide, the largest one if none is, and the
+# original upload until the variants exist
+def avatar_url(user, size):
+    variants = user.avatar_variants or {}
+    sizes = sorted(int(key) for key in variants if key.isdigit())
+    if sizes:
+        fitting = next((candidate for candidate in sizes if candidate >= size), sizes[-1])
+        return reverse('avatar', kwargs={'name': os.path.basename(variants[str(fitting)])})
+    return user.profile_picture.url if user.profile_picture else None
@@ -0,0 +1,31 @@
+from django.db import transaction
+
+SCENARIOS = {}
+# Scenarios that drive several connections at once can't run inside one transaction; they clean up after themselves
+SELF_CLEANING = set()
+
+
+def scenario(name, self_cleaning=False):
+    def register(func):
+        SCENARIOS[name] = func
+        if self_cleaning:
+            SELF_CLEANING.add(name)
+        return func
+    return register
+
+
+def run(names=None, **options):
+    results = []
+    for name in names or SCENARIOS:
+        if name in SELF_CLEANING:
+            result = SCENARIOS[name](**options)
+        else:
+            # Every other scenario seeds its own data and leaves the database as it found it
+            with transaction.atomic():
+                result = SCENARIOS[name](**options)
+                transaction.set_rollback(True)
+        results.append({'scenario': name, **result})
+    return results
+
+
+from . import plans, reads, routes, serialization, search, writes  # noqa: E402,F401
@@ -0,0 +1,148 @@
+import random
+from collections import Counter
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+
+from app.models import CustomUser, Category, Topic, Comment, Like
+from app.rendering import render_markdown
+from app.search import get_backend as get_search_backend
+from app.categories import rebuild as rebuild_category_stats
+from app.summaries import rebuild as rebuild_summaries
+from app.trending import recompute as recompute_hot_scores
+
+PASSWORD = 'bench-password'
+RATING_STEP = Decimal('0.05')
+
+WORDS = (
+    'forum thread reply django query index cache latency topic comment like user python database '
+    'migration request response template render serializer token session page cursor search'
+).split()
+
+
+def zipf_weights(count, exponent=1.1):
+    return [1 / (rank + 1) ** exponent for rank in range(count)]
+
+
+def sentence(rng, words=12):
+    return ' '.join(rng.choices(WORDS, k=words))
+
+
+class Dataset:
+    def __init__(self, users, categories, topics, comments, likes):
+        self.users = users
+        self.categories = categories
+        self.topics = topics
+        self.comments = comments
+        self.likes = likes
+
+    @property
+    def hot_topic(self):
+        return self.topics[0]
+
+    @property
+    def deepest_comment(self):
+        return max(self.comments, key=lambda comment: comment.depth)
+
+    def summary(self):
+        return {
+            'users': len(self.users),
+            'categories': len(self.categories),
+            'topics': len(self.topics),
+            'comments': len(self.comments),
+            'likes': self.likes,
+            'max_depth': self.deepest_comment.depth if self.comments else 0,
+        }
+
+
+# Builds a forum whose shape is fully determined by scale and seed: a handful of authors
+# write most topics, a few topics attract most comments, replies favour the latest
+# comments of a topic so long chains form, and likes follow a Zipf distribution.
+# Everything is planned in memory first so the writes are plain bulk inserts.
+def generate(scale=1, seed=1, prefix='bench', reply_ratio=0.7, max_depth=40, search_index=True):
+    rng = random.Random(seed)
+    user_count = max(10, int(200 * scale))
+    category_count = 10
+    topic_count = max(5, int(500 * scale))
+    comment_count = max(20, int(20000 * scale))
+    like_target = max(20, int(50000 * scale))
+
+    user_weights = zipf_weights(user_count)
+    topic_weights = zipf_weights(topic_count)
+
+    topic_authors = rng.choices(range(user_count), user_weights, k=topic_count)
+    comment_topics = rng.choices(range(topic_count), topic_weights, k=comment_count)
+    comment_authors = rng.choices(range(user_count), user_weights, k=comment_count)
+
+    # (topic, parent, author, depth) per comment, parents always planned before their replies
+    plan = []
+    recent = [[] for _ in range(topic_count)]
+    for i, topic in enumerate(comment_topics):
+        parent = None
+        if recent[topic] and rng.random() < reply_ratio:
+            candidate = rng.choice(recent[topic][-3:])
+            if plan[candidate][3] < max_depth:
+                parent = candidate
+        depth = plan[parent][3] + 1 if parent is not None else 0
+        plan.append((topic, parent, comment_authors[i], depth))
+        recent[topic].append(i)
+
+    comment_weights = zipf_weights(comment_count, exponent=0.9)
+    rng.shuffle(comment_weights)
+    liked = set(zip(
+        rng.choices(range(user_count), k=like_target),
+        rng.choices(range(comment_count), comment_weights, k=like_target),
+    ))
+    likes_per_comment = Counter(comment for _, comment in liked)
+    replies_per_comment = Counter(parent for _, parent, _, _ in plan if parent is not None)
+    rating = Counter()
+    for comment, total in likes_per_comment.items():
+        rating[plan[comment][2]] += total
+
+    password = make_password(PASSWORD)
+    users = CustomUser.objects.bulk_create(
+        (CustomUser(username=f'{prefix}-user-{i}', email=f'{prefix}-user-{i}@example.com', password=password,
+                    rating=min(RATING_STEP * rating[i], Decimal('999.99')), is_staff=i == 0)
+         for i in range(user_count)),
+        batch_size=500,
+    )
+    categories = Category.objects.bulk_create(
+        Category(name=f'{prefix}-category-{i}') for i in range(category_count)
+    )
+    topics = []
+    for i in range(topic_count):
+        content = f'# {sentence(rng, 4)}\n\n{sentence(rng, 60)}\n\n* {sentence(rng, 6)}\n* {sentence(rng, 6)}'
+        topics.append(Topic(created_by_id=users[topic_authors[i]], category=categories[i % category_count],
+                            title=sentence(rng, 6), content=content, content_html=render_markdown(content)))
+    topics = Topic.objects.bulk_create(topics, batch_size=500)
+
+    comments = [None] * comment_count
+    for depth in range(max_depth + 1):
+        level = [i for i, (_, _, _, comment_depth) in enumerate(plan) if comment_depth == depth]
+        if not level:
+            break
+        created = Comment.objects.bulk_create(
+            (Comment(topic_id=topics[plan[i][0]], user=users[plan[i][2]],
+                     parent=comments[plan[i][1]] if plan[i][1] is not None else None,
+                     content=sentence(rng, rng.randint(5, 40)),
+                     like_count=likes_per_comment[i], reply_count=replies_per_comment[i])
+             for i in level),
+            batch_size=500,
+        )
+        for i, comment in zip(level, created):
+            comment.depth = depth
+            comments[i] = comment
+
+    Like.objects.bulk_create(
+        (Like(liked_by_id=users[user], com_id=comments[comment]) for user, comment in sorted(liked)),
+        batch_size=1000,
+    )
+
+    # bulk_create skips the signals that keep summaries, counters, hot scores and the search index current
+    rebuild_summaries()
+    rebuild_category_stats()
+    recompute_hot_scores()
+    if search_index:
+        get_search_backend().rebuild()
+
+    return Dataset(users, categories, topics, comments, len(liked))
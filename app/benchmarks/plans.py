@@ -0,0 +1,88 @@
+import re
+
+from django.apps import apps
+from django.db import connection
+from django.test.utils import override_settings
+
+from . import scenario
+from .data import generate
+from .routes import SKIPPED, route_cases, send
+
+EXPLAINED = re.compile(r'^\s*(SELECT|UPDATE|DELETE|WITH)\b', re.IGNORECASE)
+TEMP_SORT = re.compile(r'USE TEMP B-TREE FOR (ORDER BY|GROUP BY|DISTINCT)')
+FULL_SCAN = re.compile(r'^SCAN (\w+)(?: AS \w+)?$')
+# Plan lines a route is expected to have, and why they don't grow with the forum
+EXPECTED = {
+    # Every category is listed and there are only a handful, sorted by name
+    'category-list': {'SCAN app_category', 'USE TEMP B-TREE FOR ORDER BY'},
+    # Only the subtree the recursive CTE collected is sorted
+    'comment_replies': {'USE TEMP B-TREE FOR ORDER BY'},
+    # bm25() rank is computed per match, so no index can order by it
+    'search': {'USE TEMP B-TREE FOR ORDER BY'},
+}
+
+
+def model_tables():
+    return {model._meta.db_table for model in apps.get_models()}
+
+
+def capture(statements):
+    def wrapper(execute, sql, params, many, context):
+        if not many and EXPLAINED.match(sql):
+            statements.append((sql, params))
+        return execute(sql, params, many, context)
+    return wrapper
+
+
+def explain(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+# Plan lines that read a whole model table or sort rows that no index keeps in order
+def plan_problems(plan, tables, expected=frozenset()):
+    problems = []
+    for line in plan:
+        if line in expected:
+            continue
+        scan = FULL_SCAN.match(line)
+        if (scan and scan.group(1) in tables) or TEMP_SORT.search(line):
+            problems.append(line)
+    return problems
+
+
+def check_case(case, tables, expected=frozenset()):
+    statements = []
+    with connection.execute_wrapper(capture(statements)):
+        response = send(case, 0)
+    report = []
+    for sql, params in statements:
+        problems = plan_problems(explain(sql, params), tables, expected)
+        if problems:
+            report.append({'sql': sql, 'problems': problems})
+    return response.status_code, report
+
+
+# Replays every route once against a seeded dataset and runs EXPLAIN QUERY PLAN on each
+# statement it issued. Without sqlite_stat1 the planner takes every table to be large, so the
+# plans are the ones a big forum gets; ANALYZE on a small seed would make full scans look cheap.
+@scenario('query_plans')
+def query_plans(scale=1, seed=1, **options):
+    if connection.vendor != 'sqlite':
+        return {'skipped': f'EXPLAIN QUERY PLAN is SQLite syntax, not {connection.vendor}'}
+    dataset = generate(scale=scale, seed=seed)
+
+    tables = model_tables()
+    routes = {}
+    with override_settings(ALLOWED_HOSTS=['*'], RESPONSE_CACHE_TIMEOUT=0, THROTTLE_BUCKETS={}):
+        for name, case in route_cases(dataset).items():
+            status, report = check_case(case, tables, EXPECTED.get(name, frozenset()))
+            routes[name] = {'status': status, 'regressions': report}
+
+    return {
+        'dataset': dataset.summary(),
+        'routes': routes,
+        'skipped': SKIPPED,
+        'regressed': sorted(name for name, route in routes.items() if route['regressions']),
+    }
@@ -0,0 +1,94 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connections
+from django.test import Client, AsyncClient
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from app.models import CustomUser, Category, Topic, Comment
+
+from . import scenario
+from .writes import percentile
+
+
+def summarize(latencies, elapsed):
+    return {
+        'requests': len(latencies),
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.5), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+    }
+
+
+def run_sync(urls, concurrency):
+    def worker(chunk):
+        client = Client()
+        latencies = []
+        try:
+            for url in chunk:
+                started = time.perf_counter()
+                client.get(url)
+                latencies.append((time.perf_counter() - started) * 1000)
+        finally:
+            connections.close_all()
+        return latencies
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(worker, [urls[i::concurrency] for i in range(concurrency)]))
+    return summarize([value for chunk in results for value in chunk], time.perf_counter() - started)
+
+
+async def run_async(urls, concurrency):
+    client = AsyncClient()
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def fetch(url):
+        async with semaphore:
+            started = time.perf_counter()
+            await client.get(url)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(fetch(url) for url in urls))
+    return summarize(latencies, time.perf_counter() - started)
+
+
+@scenario('async_reads', self_cleaning=True)
+def async_reads(scale=1, concurrency=16, **options):
+    prefix = f'bench-reads-{time.time_ns()}'
+    author = CustomUser.objects.create(username=prefix)
+    category = Category.objects.create(name=prefix)
+    topics = Topic.objects.bulk_create(
+        Topic(created_by_id=author, category=category, title=f'topic {i}', content='text') for i in range(20)
+    )
+    Comment.objects.bulk_create(
+        Comment(user=author, topic_id=topics[i % len(topics)], content=f'comment {i}') for i in range(400)
+    )
+
+    requests = int(400 * scale)
+    routes = [
+        ('topic-list', 'async-topic-list', {}),
+        ('topic-list-by-category', 'async-topic-list-by-category', {'category_pk': category.pk}),
+        ('topic-detail', 'async-topic-detail', {'pk': topics[0].pk}),
+        ('topic_comments', 'async-topic-comments', {'topic_id': topics[0].pk}),
+        ('last-news', 'async-last-news', {}),
+    ]
+    results = {}
+    try:
+        # Compare the views themselves, not the response cache in front of the sync ones
+        with override_settings(RESPONSE_CACHE_TIMEOUT=0, ALLOWED_HOSTS=['*']):
+            for sync_name, async_name, kwargs in routes:
+                sync_urls = [reverse(sync_name, kwargs=kwargs)] * requests
+                async_urls = [reverse(async_name, kwargs=kwargs)] * requests
+                results[sync_name] = {
+                    'wsgi': run_sync(sync_urls, concurrency),
+                    'asgi': asyncio.run(run_async(async_urls, concurrency)),
+                }
+    finally:
+        category.delete()
+        author.delete()
+    return {'concurrency': concurrency, 'routes': results}
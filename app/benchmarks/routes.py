@@ -0,0 +1,146 @@
+import statistics
+import time
+from collections import Counter
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLPattern, get_resolver, reverse
+
+from app.auth import ForumRefreshToken
+
+from . import scenario
+from .data import PASSWORD, generate
+from .writes import percentile
+
+# The event stream never finishes a response, so it can't be timed request by request, and
+# uploads write files that the scenario's rollback wouldn't remove
+SKIPPED = {
+    'topic-events': 'server-sent event stream',
+    'profile-picture': 'writes to media storage',
+    'avatar': 'serves files written by profile-picture',
+}
+SEARCHES = ['query cache', 'forum', 'late']
+
+
+def route_names():
+    return {pattern.name for pattern in get_resolver().url_patterns
+            if isinstance(pattern, URLPattern) and pattern.name}
+
+
+def send(case, i):
+    client, method, url, data = (value(i) if callable(value) else value for value in case)
+    if method == 'get':
+        return client.get(url, data)
+    return client.post(url, data, content_type='application/json')
+
+
+def measure(case, requests):
+    latencies = []
+    queries = []
+    statuses = Counter()
+    for i in range(requests):
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            response = send(case, i)
+            latencies.append((time.perf_counter() - started) * 1000)
+        queries.append(len(ctx.captured_queries))
+        statuses[response.status_code] += 1
+    return {
+        'requests': requests,
+        'p50_ms': round(statistics.median(latencies), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'queries_mean': round(statistics.mean(queries), 2),
+        'queries_max': max(queries),
+        'statuses': {str(code): count for code, count in sorted(statuses.items())},
+    }
+
+
+# (client, method, url, data) for every route; client, url and data may be callables of the request number
+def route_cases(dataset):
+    admin, member = dataset.users[0], dataset.users[1]
+    topic = dataset.hot_topic
+    deep = dataset.deepest_comment
+    thread_root = next(comment for comment in dataset.comments if comment.parent_id is None and comment.reply_count)
+    refresh = ForumRefreshToken.for_user(member)
+
+    anonymous = Client()
+    signed_in = Client(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+    staff = Client(HTTP_AUTHORIZATION=f'Bearer {ForumRefreshToken.for_user(admin).access_token}')
+    comments = dataset.comments
+
+    cases = {
+        'register': (anonymous, 'post', reverse('register'), lambda i: {
+            'username': f'bench-register-{i}', 'email': f'bench-register-{i}@example.com', 'password': PASSWORD,
+        }),
+        'token_obtain_pair': (anonymous, 'post', reverse('token_obtain_pair'),
+                              {'username': member.username, 'password': PASSWORD}),
+        'token_refresh': (anonymous, 'post', reverse('token_refresh'), {'refresh': str(refresh)}),
+        'token_verify': (anonymous, 'post', reverse('token_verify'), {'token': str(refresh.access_token)}),
+        'profile-page': (signed_in, 'get', reverse('profile-page'), None),
+        'others-profile-page': (anonymous, 'get', reverse('others-profile-page', kwargs={'user_id': admin.pk}), None),
+        # Logging out revokes the token, so every request signs in afresh
+        'logout': (lambda i: Client(HTTP_AUTHORIZATION=f'Bearer {ForumRefreshToken.for_user(member).access_token}'),
+                   'post', reverse('logout'), None),
+        'create_topic': (signed_in, 'post', reverse('create_topic'), lambda i: {
+            'title': f'bench topic {i}', 'content': 'Some **markdown** text', 'category': topic.category_id,
+        }),
+        'topic-list': (anonymous, 'get', reverse('topic-list'), None),
+        'topic-detail': (anonymous, 'get', reverse('topic-detail', kwargs={'pk': topic.pk}), None),
+        'topic-list-by-category': (anonymous, 'get',
+                                   reverse('topic-list-by-category', kwargs={'category_pk': topic.category_id}), None),
+        'category-list': (anonymous, 'get', reverse('category-list'), None),
+        'last-news': (anonymous, 'get', reverse('last-news'), None),
+        'trending-topics': (anonymous, 'get', reverse('trending-topics'), None),
+        'trending-topics-by-category': (anonymous, 'get', reverse('trending-topics-by-category',
+                                                                  kwargs={'category_pk': topic.category_id}), None),
+        'create_comment': (signed_in, 'post', reverse('create_comment', kwargs={'topic_id': topic.pk}),
+                           {'content': 'bench comment'}),
+        'reply_comment': (signed_in, 'post',
+                          reverse('reply_comment', kwargs={'topic_id': deep.topic_id_id, 'parent_id': deep.pk}),
+                          {'content': 'bench reply'}),
+        'topic_comments': (anonymous, 'get', reverse('topic_comments', kwargs={'topic_id': topic.pk}), None),
+        'topic_comment_tree': (anonymous, 'get', reverse('topic_comment_tree', kwargs={'topic_id': topic.pk}), None),
+        'comment_replies': (anonymous, 'get', reverse('comment_replies', kwargs={'comment_id': thread_root.pk}), None),
+        'like_comment': (signed_in, 'post',
+                         lambda i: reverse('like_comment', kwargs={'comment_id': comments[i % len(comments)].pk}), None),
+        'like_comments': (signed_in, 'post', reverse('like_comments'), lambda i: {'likes': [
+            {'comment_id': comment.pk, 'liked': i % 2 == 0} for comment in comments[:50]
+        ]}),
+        'async-topic-list': (anonymous, 'get', reverse('async-topic-list'), None),
+        'async-topic-detail': (anonymous, 'get', reverse('async-topic-detail', kwargs={'pk': topic.pk}), None),
+        'async-topic-page': (anonymous, 'get', reverse('async-topic-page', kwargs={'pk': topic.pk}), None),
+        'async-topic-list-by-category': (anonymous, 'get', reverse('async-topic-list-by-category',
+                                                                   kwargs={'category_pk': topic.category_id}), None),
+        'async-last-news': (anonymous, 'get', reverse('async-last-news'), None),
+        'async-topic-comments': (anonymous, 'get', reverse('async-topic-comments', kwargs={'topic_id': topic.pk}),
+                                 None),
+        'search': (anonymous, 'get', reverse('search'), lambda i: {'q': SEARCHES[i % len(SEARCHES)]}),
+        'response-cache-stats': (staff, 'get', reverse('response-cache-stats'), None),
+        'metrics': (anonymous, 'get', reverse('metrics'), None),
+    }
+    return cases
+
+
+@scenario('routes')
+def routes(scale=1, seed=1, requests=None, cached=False, **options):
+    dataset = generate(scale=scale, seed=seed)
+    requests = requests or max(5, int(50 * scale))
+    cases = route_cases(dataset)
+
+    results = {}
+    # Every route is timed many times over by one client, which the write throttles would cut short
+    overrides = {'ALLOWED_HOSTS': ['*'], 'THROTTLE_BUCKETS': {}}
+    if not cached:
+        overrides['RESPONSE_CACHE_TIMEOUT'] = 0
+    with override_settings(**overrides):
+        for name, case in cases.items():
+            results[name] = measure(case, requests)
+
+    return {
+        'dataset': dataset.summary(),
+        'cached': cached,
+        'routes': results,
+        'skipped': SKIPPED,
+        'uncovered': sorted(route_names() - set(cases) - set(SKIPPED)),
+    }
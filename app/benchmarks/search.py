@@ -0,0 +1,67 @@
+import random
+import statistics
+import time
+
+from django.db import connection
+
+from app.models import CustomUser, Category, Topic, Comment
+from app.search import get_backend
+
+from . import scenario
+
+
+def vocabulary(rng, size=5000):
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    return [''.join(rng.choice(letters) for _ in range(rng.randint(3, 10))) for _ in range(size)]
+
+
+@scenario('search')
+def search(scale=1, seed=1, **options):
+    rng = random.Random(seed)
+    words = vocabulary(rng)
+    # Zipf-like weights so a few words are common and most are rare, like real text
+    weights = [1 / (rank + 1) for rank in range(len(words))]
+    comment_count = int(1_000_000 * scale)
+    topic_count = max(1, comment_count // 100)
+
+    author = CustomUser.objects.create(username='bench-search-author')
+    categories = Category.objects.bulk_create(Category(name=f'bench-category-{i}') for i in range(10))
+    topics = Topic.objects.bulk_create(
+        (Topic(created_by_id=author, category=categories[i % len(categories)], title=' '.join(rng.choices(words, k=5)),
+               content=' '.join(rng.choices(words, weights, k=60)))
+         for i in range(topic_count)),
+        batch_size=1000,
+    )
+
+    started = time.perf_counter()
+    for start in range(0, comment_count, 5000):
+        Comment.objects.bulk_create(
+            Comment(user=author, topic_id=topics[i % topic_count], content=' '.join(rng.choices(words, weights, k=30)))
+            for i in range(start, min(start + 5000, comment_count))
+        )
+    load_seconds = time.perf_counter() - started
+
+    backend = get_backend()
+    started = time.perf_counter()
+    documents = backend.rebuild(chunk_size=50000)
+    index_seconds = time.perf_counter() - started
+
+    queries = [' '.join(rng.choices(words[:500], k=rng.randint(1, 3))) for _ in range(200)]
+    latencies = []
+    for query in queries:
+        category_id = rng.choice([None, categories[0].pk])
+        started = time.perf_counter()
+        backend.search(query, category_id=category_id, limit=20, offset=rng.choice([0, 0, 20, 100]))
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    latencies.sort()
+    return {
+        'backend': connection.vendor,
+        'comments': comment_count,
+        'documents': documents,
+        'load_seconds': round(load_seconds, 2),
+        'index_seconds': round(index_seconds, 2),
+        'queries': len(queries),
+        'p50_ms': round(statistics.median(latencies), 3),
+        'p99_ms': round(latencies[int(len(latencies) * 0.99) - 1], 3),
+    }
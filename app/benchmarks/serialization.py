@@ -0,0 +1,36 @@
+import time
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from app.models import CustomUser, Category, Topic
+from app.serializers import TopicSummarySerializer
+
+from . import scenario
+
+
+@scenario('topic_serialization')
+def topic_serialization(scale=1, **options):
+    count = int(1000 * scale)
+    authors = CustomUser.objects.bulk_create(
+        CustomUser(username=f'bench-author-{i}') for i in range(50)
+    )
+    categories = Category.objects.bulk_create(Category(name=f'bench-category-{i}') for i in range(10))
+    Topic.objects.bulk_create(
+        Topic(created_by_id=authors[i % len(authors)], category=categories[i % len(categories)],
+              title=f'topic {i}', content='')
+        for i in range(count)
+    )
+
+    with CaptureQueriesContext(connection) as ctx:
+        started = time.perf_counter()
+        topics = list(Topic.objects.for_listing().order_by('-created_at')[:count])
+        data = TopicSummarySerializer(topics, many=True).data
+        elapsed = time.perf_counter() - started
+
+    return {
+        'topics': len(data),
+        'queries': len(ctx.captured_queries),
+        'seconds': round(elapsed, 4),
+        'topics_per_second': round(len(data) / elapsed),
+    }
@@ -0,0 +1,171 @@
+import random
+import statistics
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import connection, connections
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from app.models import CustomUser, Category, Topic, Comment
+from app.throttles import get_buckets
+
+from . import scenario
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[max(0, int(len(values) * fraction) - 1)] if values else None
+
+
+def database_profile():
+    profile = {'vendor': connection.vendor, 'conn_max_age': settings.DATABASES['default'].get('CONN_MAX_AGE', 0)}
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            for pragma in ('journal_mode', 'busy_timeout', 'synchronous'):
+                cursor.execute(f'PRAGMA {pragma}')
+                profile[pragma] = cursor.fetchone()[0]
+    return profile
+
+
+def latency_summary(latencies):
+    return {
+        **{f'{kind}_p50_ms': round(statistics.median(values), 2) for kind, values in latencies.items() if values},
+        **{f'{kind}_p99_ms': round(percentile(values, 0.99), 2) for kind, values in latencies.items() if values},
+    }
+
+
+class Tally:
+    def __init__(self):
+        self.latencies = {'like': [], 'comment': []}
+        self.statuses = Counter()
+        self.errors = []
+        self.lock = threading.Lock()
+
+    def add(self, kind, response, failed, elapsed):
+        with self.lock:
+            if response is not None:
+                self.statuses[response.status_code] += 1
+            if failed:
+                self.errors.append(str(failed))
+            else:
+                self.latencies[kind].append(elapsed)
+
+
+class WriteLoad:
+    def __init__(self, workers, seed):
+        prefix = f'bench-writes-{time.time_ns()}'
+        self.seed = seed
+        self.users = [CustomUser.objects.create(username=f'{prefix}-{i}') for i in range(workers)]
+        self.category = Category.objects.create(name=prefix)
+        self.topic = Topic.objects.create(created_by_id=self.users[0], title=prefix, category=self.category,
+                                          content='')
+        self.comments = [Comment.objects.create(user=self.users[i % workers], content='seed', topic_id=self.topic)
+                         for i in range(20)]
+
+    def client(self, index):
+        # A client address per worker, so per-IP buckets don't lump the workers together
+        client = APIClient(HTTP_HOST='localhost', REMOTE_ADDR=f'10.0.0.{index + 1}')
+        client.force_authenticate(self.users[index])
+        return client
+
+    def post(self, client, kind, comment, tally):
+        if kind == 'like':
+            url = reverse('like_comment', kwargs={'comment_id': comment.pk})
+            data = None
+        else:
+            url = reverse('create_comment', kwargs={'topic_id': self.topic.pk})
+            data = {'content': 'load test'}
+        started = time.perf_counter()
+        response = None
+        try:
+            response = client.post(url, data)
+            failed = response.status_code >= 400
+        except Exception as exc:
+            failed = exc
+        tally.add(kind, response, failed, (time.perf_counter() - started) * 1000)
+
+    def mixed(self, index, operations, tally, pause=0):
+        rng = random.Random(self.seed + index)
+        client = self.client(index)
+        try:
+            for _ in range(operations):
+                kind = 'like' if rng.random() < 0.7 else 'comment'
+                self.post(client, kind, rng.choice(self.comments), tally)
+                time.sleep(pause)
+        finally:
+            connections.close_all()
+
+    def hammer(self, index, operations, tally):
+        client = self.client(index)
+        try:
+            for i in range(operations):
+                self.post(client, 'like', self.comments[i % 2], tally)
+        finally:
+            connections.close_all()
+
+    def cleanup(self):
+        self.topic.delete()
+        self.category.delete()
+        CustomUser.objects.filter(pk__in=[user.pk for user in self.users]).delete()
+
+
+@scenario('write_throughput', self_cleaning=True)
+def write_throughput(scale=1, seed=1, workers=8, **options):
+    operations = int(200 * scale)
+    load = WriteLoad(workers, seed)
+    tally = Tally()
+    try:
+        # Raw write capacity; throttling is what write_abuse measures
+        with override_settings(THROTTLE_BUCKETS={}):
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                list(pool.map(lambda index: load.mixed(index, operations, tally), range(workers)))
+            elapsed = time.perf_counter() - started
+    finally:
+        load.cleanup()
+
+    completed = sum(len(values) for values in tally.latencies.values())
+    return {
+        'profile': database_profile(),
+        'workers': workers,
+        'operations': workers * operations,
+        'errors': len(tally.errors),
+        'error_samples': sorted(set(tally.errors))[:3],
+        'writes_per_second': round(completed / elapsed, 1),
+        **latency_summary(tally.latencies),
+    }
+
+
+def abuse_run(scale, seed, workers):
+    load = WriteLoad(workers + 1, seed)
+    users, abuser = Tally(), Tally()
+    try:
+        with ThreadPoolExecutor(max_workers=workers + 1) as pool:
+            flood = pool.submit(load.hammer, workers, int(1000 * scale), abuser)
+            list(pool.map(lambda index: load.mixed(index, max(5, int(20 * scale)), users, pause=0.01),
+                          range(workers)))
+            flood.result()
+    finally:
+        load.cleanup()
+    return {
+        'users': {'errors': len(users.errors), **latency_summary(users.latencies)},
+        'abuser': {'statuses': {str(code): count for code, count in sorted(abuser.statuses.items())},
+                   **latency_summary(abuser.latencies)},
+    }
+
+
+# One client toggles likes flat out while the others write at a human pace. Comparing the
+# other users' p99 with and without the token buckets shows what the abuser costs them.
+@scenario('write_abuse', self_cleaning=True)
+def write_abuse(scale=1, seed=1, workers=4, **options):
+    results = {}
+    for name, overrides in (('unthrottled', {'THROTTLE_BUCKETS': {}}), ('throttled', {})):
+        get_buckets().reset()
+        with override_settings(**overrides):
+            results[name] = abuse_run(scale, seed, workers)
+    return {'profile': database_profile(), 'workers': workers, **results}
@@ -0,0 +1,108 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def response_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def _scope_key(scope):
+    return f'response-scope:{scope}'
+
+
+def _scope_versions(scopes):
+    cache = response_cache()
+    keys = [_scope_key(scope) for scope in scopes]
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # A fresh token rather than a counter, so an evicted version can never resurrect old entries
+            cache.add(key, time.time_ns(), None)
+            versions[key] = cache.get(key)
+    return [str(versions[key]) for key in keys]
+
+
+def invalidate(*scopes):
+    response_cache().delete_many([_scope_key(scope) for scope in scopes])
+
+
+def response_key(name, scopes, request):
+    return f'response:{name}:{":".join(_scope_versions(scopes))}:{request.get_full_path()}'
+
+
+async def cached_response(name, scopes, request, build):
+    # CachedResponseMixin for async views; build is a coroutine function returning the response
+    timeout = settings.RESPONSE_CACHE_TIMEOUT
+    if not timeout:
+        return await build()
+    key = response_key(name, scopes, request)
+    cache = response_cache()
+    cached = await cache.aget(key)
+    if cached is not None:
+        record(name, 'hits')
+        content, content_type = cached
+        return HttpResponse(content, content_type=content_type)
+
+    record(name, 'misses')
+    response = await build()
+    if response.status_code == 200:
+        await cache.aset(key, (response.content, response['Content-Type']), timeout)
+    return response
+
+
+def record(name, outcome):
+    with _stats_lock:
+        counters = _stats.setdefault(name, {'hits': 0, 'misses': 0})
+        counters[outcome] += 1
+
+
+def cache_stats():
+    with _stats_lock:
+        return {name: dict(counters) for name, counters in _stats.items()}
+
+
+# Serves GET responses from the response cache, keyed by path and query string. Entries
+# belong to the scopes returned by get_cache_scopes(); app.signals drops a scope when a
+# row it depends on changes.
+class CachedResponseMixin:
+    cache_name = None
+
+    def get_cache_scopes(self):
+        return []
+
+    def should_cache(self, request):
+        return True
+
+    def dispatch(self, request, *args, **kwargs):
+        timeout = settings.RESPONSE_CACHE_TIMEOUT
+        if request.method != 'GET' or not timeout or not self.should_cache(request):
+            return super().dispatch(request, *args, **kwargs)
+
+        self.kwargs = kwargs
+        name = self.cache_name or type(self).__name__
+        key = response_key(name, self.get_cache_scopes(), request)
+        cache = response_cache()
+        cached = cache.get(key)
+        if cached is not None:
+            record(name, 'hits')
+            content, content_type = cached
+            return HttpResponse(content, content_type=content_type)
+
+        record(name, 'misses')
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code == 200:
+            if hasattr(response, 'render'):
+                # app.metrics imports this module for its counters
+                from .metrics import timed
+
+                with timed('render'):
+                    response.render()
+            cache.set(key, (response.content, response['Content-Type']), timeout)
+        return response
@@ -0,0 +1,82 @@
+from django.db.models import Count, F, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .aggregates import latest, subquery
+from .models import Category, Comment, Topic
+
+
+def topic_category(topic_id):
+    return Subquery(Topic.objects.filter(pk=topic_id).values('category_id')[:1])
+
+
+def latest_topic(category_id, exclude=None):
+    topics = Topic.objects.filter(category_id=category_id)
+    if exclude is not None:
+        topics = topics.exclude(pk=exclude)
+    return Subquery(topics.order_by('-created_at', '-id').values('pk')[:1])
+
+
+def record_topic(topic):
+    Category.objects.filter(pk=topic.category_id).update(
+        topic_count=F('topic_count') + 1,
+        last_topic=topic.pk,
+        last_activity_at=topic.created_at,
+    )
+
+
+def record_topic_removal(topic):
+    # Clamped at zero like the user summaries; the last topic and activity fall back to what is left
+    topics = Topic.objects.filter(category_id=topic.category_id).exclude(pk=topic.pk)
+    comments = Comment.objects.filter(topic_id__category_id=topic.category_id).exclude(topic_id=topic.pk)
+    Category.objects.filter(pk=topic.category_id).update(
+        topic_count=Greatest(F('topic_count') - 1, 0),
+        last_topic=latest_topic(topic.category_id, exclude=topic.pk),
+        last_activity_at=latest(subquery(topics, 'category', Max('created_at')),
+                                subquery(comments, 'topic_id__category', Max('posted_at'))),
+    )
+
+
+def record_comment(comment):
+    # The topic is usually not loaded, so its category is resolved inside the UPDATE
+    Category.objects.filter(pk=topic_category(comment.topic_id_id)).update(
+        comment_count=F('comment_count') + 1,
+        last_activity_at=comment.posted_at,
+    )
+
+
+def record_comment_removal(comment):
+    Category.objects.filter(pk=topic_category(comment.topic_id_id)).update(
+        comment_count=Greatest(F('comment_count') - 1, 0),
+    )
+
+
+def record_topic_move(old_category_id, topic):
+    # Moves are rare and carry the topic's comments along, so both ends are simply recounted
+    recount(Category.objects.filter(pk__in=[old_category_id, topic.category_id]))
+
+
+def recount(categories):
+    topics = Topic.objects.filter(category=OuterRef('pk'))
+    comments = Comment.objects.filter(topic_id__category=OuterRef('pk'))
+    last_topic = subquery(topics, 'category', Max('created_at'))
+    last_comment = subquery(comments, 'topic_id__category', Max('posted_at'))
+    categories.update(
+        topic_count=Coalesce(subquery(topics, 'category', Count('pk')), 0),
+        comment_count=Coalesce(subquery(comments, 'topic_id__category', Count('pk')), 0),
+        last_topic=latest_topic(OuterRef('pk')),
+        last_activity_at=latest(last_topic, last_comment),
+    )
+
+
+def stats():
+    return {row[0]: row[1:] for row in Category.objects.values_list(
+        'pk', 'topic_count', 'comment_count', 'last_topic', 'last_activity_at')}
+
+
+# Recomputes every category from the Topic and Comment tables and returns the ids of the
+# ones whose stored values had drifted
+def rebuild():
+    before = stats()
+    recount(Category.objects.all())
+    after = stats()
+    return sorted(pk for pk, values in after.items() if before.get(pk) != values)
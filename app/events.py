@@ -0,0 +1,111 @@
+import asyncio
+import json
+import threading
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+
+class Subscription:
+    def __init__(self, broker, channel, maxsize):
+        self.broker = broker
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+
+    def deliver(self, event):
+        # Called on the subscriber's loop; a client that can't keep up loses the oldest events
+        if self.queue.full():
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+    async def get(self, timeout=None):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    def __init__(self):
+        self.subscriptions = defaultdict(set)
+        self.lock = threading.Lock()
+
+    def subscribe(self, channel, maxsize=100):
+        subscription = Subscription(self, channel, maxsize)
+        with self.lock:
+            self.subscriptions[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.subscriptions[subscription.channel].discard(subscription)
+            if not self.subscriptions[subscription.channel]:
+                del self.subscriptions[subscription.channel]
+
+    def publish(self, channel, event):
+        # Publishers are sync views running in worker threads, so hand events over to each subscriber's loop
+        with self.lock:
+            subscriptions = list(self.subscriptions.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+
+
+class RedisBroker(InProcessBroker):
+    # Fans events out across processes: publish goes to Redis, and one listener thread per
+    # process relays everything it receives to the local subscribers
+    def __init__(self, url=None):
+        super().__init__()
+        import redis
+
+        self.redis = redis.Redis.from_url(url or settings.EVENT_BROKER_URL)
+        self.pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.psubscribe('forum:*')
+        self.listener = threading.Thread(target=self.listen, daemon=True)
+        self.listener.start()
+
+    def publish(self, channel, event):
+        self.redis.publish(f'forum:{channel}', json.dumps(event))
+
+    def listen(self):
+        for message in self.pubsub.listen():
+            channel = message['channel'].decode().removeprefix('forum:')
+            super().publish(channel, json.loads(message['data']))
+
+
+@lru_cache(maxsize=None)
+def get_broker():
+    return import_string(settings.EVENT_BROKER)()
+
+
+def topic_channel(topic_id):
+    return f'topic:{topic_id}'
+
+
+def publish_topic_event(topic_id, event):
+    # Listeners only hear about writes that actually committed
+    transaction.on_commit(lambda: get_broker().publish(topic_channel(topic_id), event))
+
+
+def format_sse(event):
+    return f'event: {event["type"]}\ndata: {json.dumps(event, default=str)}\n\n'
+
+
+async def topic_event_stream(topic_id, heartbeat=None):
+    heartbeat = settings.EVENT_STREAM_HEARTBEAT if heartbeat is None else heartbeat
+    subscription = get_broker().subscribe(topic_channel(topic_id))
+    try:
+        yield 'retry: 3000\n\n'
+        while True:
+            try:
+                event = await subscription.get(timeout=heartbeat)
+            except asyncio.TimeoutError:
+                # Keeps proxies from closing an idle stream
+                yield ': ping\n\n'
+                continue
+            yield format_sse(event)
+    finally:
+        subscription.close()
@@ -0,0 +1,54 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import get_template, render_to_string
+from django.utils.safestring import mark_safe
+
+from .metrics import timed
+
+
+def fragment_cache():
+    return caches[settings.COMMENT_FRAGMENT_CACHE_ALIAS]
+
+
+def quote_digest(parent):
+    # Covers only what the partial quotes, so likes on the parent leave its replies' fragments alone
+    return hashlib.sha256(f'{parent.user.username}\0{parent.content}'.encode()).hexdigest()[:16]
+
+
+def fragment_key(comment, liked):
+    # posted_at tells apart comments that reuse an id after a rollback or a restored backup
+    quote = quote_digest(comment.parent) if comment.parent_id else ''
+    posted = int(comment.posted_at.timestamp() * 1e6)
+    return f'comment-html:{comment.pk}:{posted}:{comment.version}:{quote}:{int(liked)}'
+
+
+def render_comment(comment, liked=False):
+    with timed('render'):
+        return get_template('comment_partial.html').render({
+            'comment': comment, 'liked_comment_ids': (comment.pk,) if liked else (),
+        })
+
+
+# Renders a thread as the concatenation of per-comment fragments. A fragment is looked up by
+# the comment's version, so after one new comment or like only that comment is rendered again.
+def render_thread(comments, liked_ids=frozenset()):
+    with timed('render'):
+        return _render_thread(comments, liked_ids)
+
+
+def _render_thread(comments, liked_ids):
+    if settings.COMMENT_RENDER_MODE == 'template':
+        return render_to_string('comments.html', {'comments': comments, 'liked_comment_ids': liked_ids})
+
+    keys = [fragment_key(comment, comment.pk in liked_ids) for comment in comments]
+    cache = fragment_cache()
+    rendered = cache.get_many(keys)
+    missing = {}
+    for comment, key in zip(comments, keys):
+        if key not in rendered:
+            rendered[key] = missing[key] = render_comment(comment, comment.pk in liked_ids)
+    if missing:
+        cache.set_many(missing, settings.COMMENT_FRAGMENT_CACHE_TIMEOUT)
+    return mark_safe('\n'.join(rendered[key] for key in keys))
@@ -0,0 +1,126 @@
+from collections import Counter
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Case, DecimalField, F, FloatField, IntegerField, Value, When
+from django.db.models.functions import Greatest
+
+from .cache import invalidate
+from .events import publish_topic_event
+from .models import Comment, CustomUser, Like, Topic, UserSummary
+
+RATING_STEP = Decimal('0.05')
+
+
+class UnknownComments(Exception):
+    def __init__(self, comment_ids):
+        super().__init__(f'Unknown comments: {", ".join(map(str, comment_ids))}')
+        self.comment_ids = comment_ids
+
+
+def liked_cache_key(user_id, topic_id):
+    return f'liked:{user_id}:{topic_id}'
+
+
+# The ids of every comment in the topic the user has liked, cached until they like or unlike one of them
+def liked_comment_ids(user, topic_id):
+    if not user.is_authenticated:
+        return frozenset()
+    key = liked_cache_key(user.id, topic_id)
+    liked = cache.get(key)
+    if liked is None:
+        liked = frozenset(Like.objects.filter(liked_by_id=user.id, com_id__topic_id=topic_id)
+                          .values_list('com_id', flat=True))
+        cache.set(key, liked, settings.LIKED_COMMENTS_CACHE_TIMEOUT)
+    return liked
+
+
+def increments(model, field, deltas, output_field, floor=None, **also):
+    # One UPDATE for any number of rows, each moved by its own delta and kept at or above `floor`;
+    # `also` is applied to the same rows
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if not deltas:
+        return 0
+    change = Case(*(When(pk=pk, then=Value(delta)) for pk, delta in deltas.items()),
+                  default=Value(0), output_field=output_field)
+    value = F(field) + change
+    if floor is not None:
+        value = Greatest(value, Value(floor), output_field=output_field)
+    return model.objects.filter(pk__in=deltas).update(**{field: value}, **also)
+
+
+def lock_liker(user_id):
+    # Every conflicting like shares the liker, so locking their row serializes concurrent writes;
+    # SQLite already allows a single writer and has no row locks
+    if connection.features.has_select_for_update:
+        list(CustomUser.objects.select_for_update().filter(pk=user_id).values_list('pk'))
+
+
+def apply_changes(added, removed):
+    comment_deltas = Counter()
+    author_deltas = Counter()
+    topic_deltas = Counter()
+    for delta, comments in ((1, added), (-1, removed)):
+        for comment in comments:
+            comment_deltas[comment.pk] += delta
+            author_deltas[comment.user_id] += delta
+            topic_deltas[comment.topic_id_id] += delta
+    increments(Comment, 'like_count', comment_deltas, IntegerField(), version=F('version') + 1)
+    increments(CustomUser, 'rating', {pk: delta * RATING_STEP for pk, delta in author_deltas.items()},
+               DecimalField(max_digits=5, decimal_places=2))
+    increments(UserSummary, 'likes_received', author_deltas, IntegerField())
+    # An unlike takes off the full like weight while the like itself has decayed since, hence the floor
+    increments(Topic, 'hot_score', {pk: delta * settings.HOT_SCORE_LIKE_WEIGHT for pk, delta in topic_deltas.items()},
+               FloatField(), floor=0.0)
+
+
+def announce(user_id, added, removed):
+    if not added and not removed:
+        return
+    topics = {comment.topic_id_id for comment in (*added, *removed)}
+    # Counters change through F() updates, which don't send post_save
+    invalidate(*(f'comments:{topic_id}' for topic_id in topics))
+    cache.delete_many([liked_cache_key(user_id, topic_id) for topic_id in topics])
+    for delta, comments in ((1, added), (-1, removed)):
+        for comment in comments:
+            publish_topic_event(comment.topic_id_id,
+                                {'type': 'like.toggled', 'comment_id': comment.pk, 'delta': delta})
+
+
+def toggle_like(user_id, comment):
+    with transaction.atomic():
+        lock_liker(user_id)
+        removed, _ = Like.objects.filter(com_id=comment, liked_by_id=user_id).delete()
+        if not removed:
+            Like.objects.create(com_id=comment, liked_by_id_id=user_id)
+        apply_changes([] if removed else [comment], [comment] if removed else [])
+    announce(user_id, [] if removed else [comment], [comment] if removed else [])
+    return not removed
+
+
+# Applies {comment_id: liked} for one user. States that already hold are left alone, so
+# retrying a batch is harmless; the whole batch is rejected if any comment is missing.
+def set_likes(user_id, states):
+    with transaction.atomic():
+        lock_liker(user_id)
+        comments = {comment.pk: comment for comment in
+                    Comment.objects.filter(pk__in=states).only('id', 'user_id', 'topic_id')}
+        missing = sorted(set(states) - set(comments))
+        if missing:
+            raise UnknownComments(missing)
+
+        liked = set(Like.objects.filter(liked_by_id=user_id, com_id__in=states).values_list('com_id', flat=True))
+        added = [comments[pk] for pk, state in states.items() if state and pk not in liked]
+        removed = [comments[pk] for pk, state in states.items() if not state and pk in liked]
+
+        if added:
+            Like.objects.bulk_create(Like(com_id=comment, liked_by_id_id=user_id) for comment in added)
+        if removed:
+            Like.objects.filter(liked_by_id=user_id, com_id__in=[comment.pk for comment in removed]).delete()
+        apply_changes(added, removed)
+    announce(user_id, added, removed)
+
+    changed = {comment.pk for comment in (*added, *removed)}
+    return [{'comment_id': pk, 'liked': state, 'changed': pk in changed} for pk, state in states.items()]
@@ -0,0 +1,30 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app import benchmarks
+
+
+class Command(BaseCommand):
+    help = 'Run benchmark scenarios against the configured database and print the results as JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', help=f'Any of: {", ".join(benchmarks.SCENARIOS)}')
+        parser.add_argument('--scale', type=float, default=1,
+                            help='Multiplier for the data volume of every scenario')
+        parser.add_argument('--seed', type=int, default=1,
+                            help='Seed for the generated data, so runs before and after a change compare like for like')
+        parser.add_argument('--output', help='Write the JSON report to this file instead of stdout')
+
+    def handle(self, *args, **options):
+        unknown = set(options['scenarios']) - set(benchmarks.SCENARIOS)
+        if unknown:
+            raise CommandError(f'Unknown scenarios: {", ".join(sorted(unknown))}')
+
+        results = benchmarks.run(options['scenarios'], scale=options['scale'], seed=options['seed'])
+        report = json.dumps(results, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(report)
+        else:
+            self.stdout.write(report)
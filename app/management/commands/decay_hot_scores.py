@@ -0,0 +1,24 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from app.trending import decay, recompute
+
+
+class Command(BaseCommand):
+    help = ('Decay Topic.hot_score by the time elapsed since the previous run, or recompute every score '
+            'from comments and likes with --recompute.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--minutes', type=float, default=60,
+                            help='Time since the previous run; schedule the command at this interval')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--recompute', action='store_true')
+
+    def handle(self, *args, **options):
+        if options['recompute']:
+            updated = recompute(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Recomputed scores for {updated} topics'))
+        else:
+            updated = decay(timedelta(minutes=options['minutes']), batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Decayed scores for {updated} topics'))
@@ -0,0 +1,74 @@
+import gzip
+import sys
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from app.models import CustomUser, Category, Topic, Comment, Like
+
+# Record type -> (queryset, {exported key: model field}), in an order where every reference points backwards
+EXPORTS = {
+    'user': (CustomUser.objects.all(), {
+        'id': 'id', 'username': 'username', 'email': 'email', 'password': 'password',
+        'first_name': 'first_name', 'last_name': 'last_name', 'is_active': 'is_active', 'is_staff': 'is_staff',
+        'is_superuser': 'is_superuser', 'date_joined': 'date_joined', 'last_login': 'last_login',
+        'rating': 'rating', 'profile_picture': 'profile_picture',
+    }),
+    'category': (Category.objects.all(), {'id': 'id', 'name': 'name'}),
+    'topic': (Topic.objects.all(), {
+        'id': 'id', 'user': 'created_by_id', 'category': 'category', 'title': 'title', 'content': 'content',
+        'content_html': 'content_html', 'created_at': 'created_at', 'updated_at': 'updated_at',
+    }),
+    'comment': (Comment.objects.all(), {
+        'id': 'id', 'user': 'user', 'topic': 'topic_id', 'parent': 'parent', 'content': 'content',
+        'posted_at': 'posted_at', 'like_count': 'like_count', 'reply_count': 'reply_count',
+    }),
+    'like': (Like.objects.all(), {'id': 'id', 'user': 'liked_by_id', 'comment': 'com_id'}),
+}
+
+
+class ExportEncoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder rounds to milliseconds, which would shift keyset cursors after a round trip
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def open_output(path, compress):
+    if path == '-':
+        return sys.stdout
+    if compress or path.endswith('.gz'):
+        return gzip.open(path, 'wt', encoding='utf-8', compresslevel=6)
+    return open(path, 'w', encoding='utf-8')
+
+
+class Command(BaseCommand):
+    help = 'Stream users, categories, topics, comments and likes to an NDJSON file (gzip for *.gz or --compress).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help="File to write, or '-' for stdout")
+        parser.add_argument('--chunk-size', type=int, default=2000)
+        parser.add_argument('--compress', action='store_true')
+
+    def handle(self, *args, **options):
+        encoder = ExportEncoder(ensure_ascii=False, separators=(',', ':'))
+        counts = {}
+        out = open_output(options['output'], options['compress'])
+        try:
+            for kind, (queryset, fields) in EXPORTS.items():
+                rows = queryset.order_by('pk').values_list(*fields.values()).iterator(chunk_size=options['chunk_size'])
+                keys = list(fields)
+                counts[kind] = 0
+                for row in rows:
+                    record = {'model': kind, **dict(zip(keys, row))}
+                    out.write(encoder.encode(record))
+                    out.write('\n')
+                    counts[kind] += 1
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+        summary = ', '.join(f'{kind}: {count}' for kind, count in counts.items())
+        self.stderr.write(self.style.SUCCESS(f'Exported {summary}'))
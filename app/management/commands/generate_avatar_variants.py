@@ -0,0 +1,35 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from app.avatars import needs_processing, process_avatar
+from app.models import CustomUser
+
+
+class Command(BaseCommand):
+    help = 'Generate profile picture variants for users whose variants are missing or out of date.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regenerate variants for every picture')
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        users = CustomUser.objects.exclude(profile_picture='').exclude(profile_picture__isnull=True)
+        pending = [user.pk for user in users.only('id', 'profile_picture', 'avatar_variants').iterator()
+                   if options['force'] or needs_processing(user)]
+
+        def process(user_id):
+            try:
+                process_avatar(user_id)
+                return True
+            except Exception as exc:
+                self.stderr.write(f'User {user_id}: {exc}')
+                return False
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            done = sum(pool.map(process, pending))
+
+        self.stdout.write(self.style.SUCCESS(f'Generated variants for {done} of {len(pending)} users'))
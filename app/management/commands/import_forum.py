@@ -0,0 +1,260 @@
+import gzip
+import json
+import sqlite3
+from contextlib import contextmanager
+from itertools import groupby, islice
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from app.cache import response_cache
+from app.models import CustomUser, Category, Topic, Comment, Like
+from app.rendering import render_markdown
+
+
+class ImportState:
+    # Old -> new id map and progress, kept on disk so memory stays flat and an interrupted import can resume
+    def __init__(self, path):
+        self.db = sqlite3.connect(path)
+        self.db.executescript('''
+            CREATE TABLE IF NOT EXISTS id_map (model TEXT, old_id INTEGER, new_id INTEGER, PRIMARY KEY (model, old_id));
+            CREATE TABLE IF NOT EXISTS pending_parent (new_id INTEGER PRIMARY KEY, old_parent INTEGER);
+            CREATE TABLE IF NOT EXISTS progress (id INTEGER PRIMARY KEY CHECK (id = 1), lines INTEGER, parents_done INTEGER);
+            INSERT OR IGNORE INTO progress VALUES (1, 0, 0);
+            CREATE TABLE IF NOT EXISTS staged_batch (id INTEGER PRIMARY KEY CHECK (id = 1), model TEXT, lines INTEGER);
+            CREATE TABLE IF NOT EXISTS staged_id (old_id INTEGER, new_id INTEGER);
+            CREATE TABLE IF NOT EXISTS staged_parent (new_id INTEGER, old_parent INTEGER);
+        ''')
+        self.db.commit()
+
+    @property
+    def lines(self):
+        return self.db.execute('SELECT lines FROM progress').fetchone()[0]
+
+    @property
+    def parents_done(self):
+        return bool(self.db.execute('SELECT parents_done FROM progress').fetchone()[0])
+
+    def lookup(self, model, old_ids):
+        old_ids = list({old_id for old_id in old_ids if old_id is not None})
+        mapping = {}
+        for start in range(0, len(old_ids), 500):
+            chunk = old_ids[start:start + 500]
+            rows = self.db.execute(
+                f'SELECT old_id, new_id FROM id_map WHERE model = ? AND old_id IN ({",".join("?" * len(chunk))})',
+                [model, *chunk],
+            )
+            mapping.update(rows)
+        return mapping
+
+    # A batch is staged while its database transaction is still open and committed here once that
+    # transaction has; a staged batch left behind by a crash is settled by Command.recover()
+    def stage(self, model, pairs, lines, pending_parents=()):
+        self.discard_staged(commit=False)
+        self.db.execute('INSERT INTO staged_batch VALUES (1, ?, ?)', [model, lines])
+        self.db.executemany('INSERT INTO staged_id VALUES (?, ?)', pairs)
+        self.db.executemany('INSERT INTO staged_parent VALUES (?, ?)', pending_parents)
+        self.db.commit()
+
+    def staged(self):
+        row = self.db.execute('SELECT model, lines FROM staged_batch').fetchone()
+        if row is None:
+            return None
+        return row[0], [new_id for new_id, in self.db.execute('SELECT new_id FROM staged_id')]
+
+    def commit_staged(self):
+        self.db.execute('INSERT OR REPLACE INTO id_map SELECT model, old_id, new_id FROM staged_batch, staged_id')
+        self.db.execute('INSERT OR REPLACE INTO pending_parent SELECT new_id, old_parent FROM staged_parent')
+        self.db.execute('UPDATE progress SET lines = (SELECT lines FROM staged_batch)')
+        self.discard_staged()
+
+    def discard_staged(self, commit=True):
+        for table in ('staged_batch', 'staged_id', 'staged_parent'):
+            self.db.execute(f'DELETE FROM {table}')
+        if commit:
+            self.db.commit()
+
+    def pending_parents(self, batch_size):
+        last = 0
+        while True:
+            rows = self.db.execute(
+                'SELECT new_id, old_parent FROM pending_parent WHERE new_id > ? ORDER BY new_id LIMIT ?', [last, batch_size],
+            ).fetchall()
+            if not rows:
+                return
+            yield rows
+            last = rows[-1][0]
+
+    def finish_parents(self):
+        self.db.execute('UPDATE progress SET parents_done = 1')
+        self.db.commit()
+
+
+def open_input(path):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+@contextmanager
+def keep_timestamps(*fields):
+    # Imported rows carry their own creation times, which auto_now_add would overwrite
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = 'Load an NDJSON dump written by export_forum, remapping every id. Re-running resumes where it stopped.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('input')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--state', help='Progress file (defaults to <input>.import-state)')
+        parser.add_argument('--skip-search-index', action='store_true',
+                            help="Don't rebuild the search index after loading")
+
+    def handle(self, *args, **options):
+        self.batch_size = options['batch_size']
+        self.state_path = options['state'] or f'{options["input"]}.import-state'
+        self.state = ImportState(self.state_path)
+        loaders = {
+            'user': self.load_users, 'category': self.load_categories, 'topic': self.load_topics,
+            'comment': self.load_comments, 'like': self.load_likes,
+        }
+
+        self.recover()
+        line_no = self.state.lines
+        if line_no:
+            self.stderr.write(f'Resuming after line {line_no}')
+        counts = dict.fromkeys(loaders, 0)
+        with open_input(options['input']) as stream, keep_timestamps(
+                Topic._meta.get_field('created_at'), Topic._meta.get_field('updated_at'),
+                Comment._meta.get_field('posted_at')):
+            records = (json.loads(line) for line in islice(stream, line_no, None))
+            for kind, group in groupby(records, key=lambda record: record['model']):
+                if kind not in loaders:
+                    raise CommandError(f'Unknown record type {kind!r} after line {line_no}')
+                while batch := list(islice(group, self.batch_size)):
+                    line_no += len(batch)
+                    with transaction.atomic():
+                        pairs, pending = loaders[kind](batch)
+                        self.state.stage(kind, pairs, line_no, pending)
+                    self.state.commit_staged()
+                    counts[kind] += len(batch)
+
+        self.link_parents()
+        call_command('rebuild_user_summaries', stdout=self.stderr)
+        call_command('rebuild_category_stats', stdout=self.stderr)
+        call_command('decay_hot_scores', recompute=True, stdout=self.stderr)
+        response_cache().clear()
+        if not options['skip_search_index']:
+            call_command('rebuild_search_index', stdout=self.stderr)
+        summary = ', '.join(f'{kind}: {count}' for kind, count in counts.items())
+        self.stderr.write(self.style.SUCCESS(f'Imported {summary}'))
+
+    def recover(self):
+        staged = self.state.staged()
+        if staged is None:
+            return
+        kind, new_ids = staged
+        model = {'user': CustomUser, 'category': Category, 'topic': Topic, 'comment': Comment, 'like': Like}[kind]
+        # Every row there means the database transaction committed before the crash; none means it rolled back
+        found = sum(model.objects.filter(pk__in=new_ids[start:start + 500]).count()
+                    for start in range(0, len(new_ids), 500))
+        if found == len(set(new_ids)):
+            self.state.commit_staged()
+            self.stderr.write(f'Recovered a {kind} batch that was committed before the last run stopped')
+        elif found == 0:
+            self.state.discard_staged()
+        else:
+            raise CommandError(f'{found} of {len(new_ids)} rows of the staged {kind} batch exist; '
+                               f'the database no longer matches {self.state_path}')
+
+    def map_ids(self, model, batch, key):
+        mapping = self.state.lookup(model, (record[key] for record in batch))
+        missing = {record[key] for record in batch if record[key] is not None} - mapping.keys()
+        if missing:
+            raise CommandError(f'{model} ids {sorted(missing)[:5]} are referenced before being imported')
+        return mapping
+
+    def load_users(self, batch):
+        existing = dict(CustomUser.objects.filter(username__in=[r['username'] for r in batch]).values_list('username', 'pk'))
+        new = [r for r in batch if r['username'] not in existing]
+        users = CustomUser.objects.bulk_create(
+            (CustomUser(
+                username=r['username'], email=r['email'], password=r['password'], first_name=r['first_name'],
+                last_name=r['last_name'], is_active=r['is_active'], is_staff=r['is_staff'],
+                is_superuser=r['is_superuser'], date_joined=parse_datetime(r['date_joined']),
+                last_login=parse_datetime(r['last_login']) if r['last_login'] else None,
+                rating=r['rating'], profile_picture=r['profile_picture'] or None,
+            ) for r in new),
+            batch_size=self.batch_size,
+        )
+        pairs = [(r['id'], existing[r['username']]) for r in batch if r['username'] in existing]
+        return pairs + [(r['id'], user.pk) for r, user in zip(new, users)], ()
+
+    def load_categories(self, batch):
+        categories = Category.objects.bulk_create(Category(name=r['name']) for r in batch)
+        return [(r['id'], category.pk) for r, category in zip(batch, categories)], ()
+
+    def load_topics(self, batch):
+        users = self.map_ids('user', batch, 'user')
+        categories = self.map_ids('category', batch, 'category')
+        # The dump's content_html is never trusted: it is rendered with |safe, so it is rebuilt from the Markdown
+        topics = Topic.objects.bulk_create(
+            (Topic(
+                created_by_id_id=users[r['user']], category_id=categories[r['category']], title=r['title'],
+                content=r['content'], content_html=render_markdown(r['content']),
+                created_at=parse_datetime(r['created_at']), updated_at=parse_datetime(r['updated_at']),
+            ) for r in batch),
+            batch_size=self.batch_size,
+        )
+        return [(r['id'], topic.pk) for r, topic in zip(batch, topics)], ()
+
+    def load_comments(self, batch):
+        users = self.map_ids('user', batch, 'user')
+        topics = self.map_ids('topic', batch, 'topic')
+        # Parents are linked in a second pass, since a parent may sit later in the same batch
+        comments = Comment.objects.bulk_create(
+            (Comment(
+                user_id=users[r['user']], topic_id_id=topics[r['topic']], content=r['content'],
+                posted_at=parse_datetime(r['posted_at']), like_count=r['like_count'], reply_count=r['reply_count'],
+            ) for r in batch),
+            batch_size=self.batch_size,
+        )
+        pairs = [(r['id'], comment.pk) for r, comment in zip(batch, comments)]
+        pending = [(comment.pk, r['parent']) for r, comment in zip(batch, comments) if r['parent'] is not None]
+        return pairs, pending
+
+    def load_likes(self, batch):
+        users = self.map_ids('user', batch, 'user')
+        comments = self.map_ids('comment', batch, 'comment')
+        likes = Like.objects.bulk_create(
+            (Like(liked_by_id_id=users[r['user']], com_id_id=comments[r['comment']]) for r in batch),
+            batch_size=self.batch_size,
+        )
+        return [(r['id'], like.pk) for r, like in zip(batch, likes)], ()
+
+    def link_parents(self):
+        if self.state.parents_done:
+            return
+        orphans = []
+        for rows in self.state.pending_parents(self.batch_size):
+            parents = self.state.lookup('comment', (old_parent for _, old_parent in rows))
+            orphans.extend(old_parent for _, old_parent in rows if old_parent not in parents)
+            comments = [Comment(pk=new_id, parent_id=parents.get(old_parent)) for new_id, old_parent in rows]
+            with transaction.atomic():
+                Comment.objects.bulk_update(comments, ['parent'], batch_size=self.batch_size)
+        if orphans:
+            self.stderr.write(self.style.WARNING(
+                f'{len(orphans)} replies point at comments missing from the dump and were imported as top-level '
+                f'comments; missing parent ids include {", ".join(map(str, sorted(set(orphans))[:5]))}'
+            ))
+        self.state.finish_parents()
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from app.cache import invalidate
+from app.categories import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute the per-category topic and comment counts, last topic and last activity.'
+
+    def handle(self, *args, **options):
+        repaired = rebuild()
+        invalidate('category-index')
+        if repaired:
+            self.stdout.write(self.style.WARNING(f'Repaired {len(repaired)} categories: '
+                                                 f'{", ".join(map(str, repaired))}'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Category stats are consistent'))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from app.models import Comment, Like
+
+
+class Command(BaseCommand):
+    help = 'Recompute Comment.like_count and Comment.reply_count from the Like and Comment tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        likes = Like.objects.filter(com_id=OuterRef('pk')).values('com_id').annotate(total=Count('pk')).values('total')
+        replies = Comment.objects.filter(parent=OuterRef('pk')).values('parent').annotate(total=Count('pk')).values('total')
+
+        last_pk = 0
+        updated = 0
+        while True:
+            pks = list(Comment.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+            if not pks:
+                break
+            with transaction.atomic():
+                updated += Comment.objects.filter(pk__in=pks).update(
+                    like_count=Coalesce(Subquery(likes), 0),
+                    reply_count=Coalesce(Subquery(replies), 0),
+                    # Cached comment fragments are keyed by version
+                    version=F('version') + 1,
+                )
+            last_pk = pks[-1]
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt counters for {updated} comments'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index from the Topic and Comment tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=10000,
+                            help='Rows copied into the index per statement')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            total = get_backend().rebuild(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Indexed {total} documents'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from app.summaries import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Recompute UserSummary rows from the Topic and Comment tables, creating any that are missing.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        rebuilt = rebuild(chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt summaries for {rebuilt} users'))
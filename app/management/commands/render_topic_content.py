@@ -0,0 +1,37 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app.models import Topic
+from app.rendering import render_markdown
+
+
+class Command(BaseCommand):
+    help = 'Re-render Topic.content_html for every topic, e.g. after MARKDOWN_EXTENSIONS changes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument('--processes', type=int, default=None,
+                            help='Worker processes for rendering (defaults to the CPU count)')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        render = partial(render_markdown, extensions=list(settings.MARKDOWN_EXTENSIONS))
+
+        last_pk = 0
+        rendered = 0
+        with ProcessPoolExecutor(max_workers=options['processes']) as pool:
+            while True:
+                topics = list(Topic.objects.filter(pk__gt=last_pk).order_by('pk').only('content')[:chunk_size])
+                if not topics:
+                    break
+                html = pool.map(render, [topic.content for topic in topics], chunksize=32)
+                for topic, content_html in zip(topics, html):
+                    topic.content_html = content_html
+                Topic.objects.bulk_update(topics, ['content_html'])
+                rendered += len(topics)
+                last_pk = topics[-1].pk
+
+        self.stdout.write(self.style.SUCCESS(f'Rendered {rendered} topics'))
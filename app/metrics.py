@@ -0,0 +1,124 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from .cache import cache_stats
+from .throttles import throttle_stats
+
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+METRICS = {
+    'request_duration_seconds': ('Total time spent handling the request', DURATION_BUCKETS),
+    'db_duration_seconds': ('Time spent waiting on database queries', DURATION_BUCKETS),
+    'serializer_duration_seconds': ('Time spent in DRF serializers', DURATION_BUCKETS),
+    'render_duration_seconds': ('Time spent rendering the response body', DURATION_BUCKETS),
+    'db_queries': ('Database queries per request', QUERY_BUCKETS),
+}
+
+current_request = ContextVar('current_request', default=None)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.counts), self.sum
+
+
+class Registry:
+    def __init__(self):
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def histogram(self, name, route):
+        key = (name, route)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(key, Histogram(METRICS[name][1]))
+        return histogram
+
+    def observe(self, route, request_metrics, total):
+        self.histogram('request_duration_seconds', route).observe(total)
+        self.histogram('db_queries', route).observe(request_metrics.queries)
+        for section in ('db', 'serializer', 'render'):
+            self.histogram(f'{section}_duration_seconds', route).observe(request_metrics.sections[section])
+
+    def render(self):
+        lines = []
+        for name, (help_text, _) in METRICS.items():
+            lines.append(f'# HELP forum_{name} {help_text}')
+            lines.append(f'# TYPE forum_{name} histogram')
+            for (metric, route), histogram in sorted(self.histograms.items()):
+                if metric != name:
+                    continue
+                counts, total = histogram.snapshot()
+                cumulative = 0
+                for bound, count in zip((*histogram.buckets, '+Inf'), counts):
+                    cumulative += count
+                    lines.append(f'forum_{name}_bucket{{route="{route}",le="{bound}"}} {cumulative}')
+                lines.append(f'forum_{name}_sum{{route="{route}"}} {total:.6f}')
+                lines.append(f'forum_{name}_count{{route="{route}"}} {cumulative}')
+
+        lines.append('# HELP forum_response_cache_total Response cache lookups by outcome')
+        lines.append('# TYPE forum_response_cache_total counter')
+        for view, counters in sorted(cache_stats().items()):
+            for outcome, count in counters.items():
+                lines.append(f'forum_response_cache_total{{view="{view}",outcome="{outcome}"}} {count}')
+
+        lines.append('# HELP forum_throttle_total Throttled write requests by scope, bucket and outcome')
+        lines.append('# TYPE forum_throttle_total counter')
+        for (scope, kind, outcome), count in sorted(throttle_stats().items()):
+            lines.append(f'forum_throttle_total{{scope="{scope}",kind="{kind}",outcome="{outcome}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class RequestMetrics:
+    def __init__(self, capture_sql=False):
+        self.queries = 0
+        self.sections = {'db': 0.0, 'serializer': 0.0, 'render': 0.0}
+        self.active = set()
+        self.sql = [] if capture_sql else None
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sections['db'] += time.perf_counter() - started
+            self.queries += 1
+            if self.sql is not None:
+                self.sql.append(sql)
+
+
+@contextmanager
+def timed(section):
+    request_metrics = current_request.get()
+    # Nested serializers would otherwise count their time twice
+    if request_metrics is None or section in request_metrics.active:
+        yield
+        return
+    request_metrics.active.add(section)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        request_metrics.sections[section] += time.perf_counter() - started
+        request_metrics.active.discard(section)
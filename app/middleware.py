@@ -0,0 +1,75 @@
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connection
+
+from .metrics import RequestMetrics, current_request, registry
+
+logger = logging.getLogger('app.metrics')
+
+
+# Records query count, database, serializer and render time plus total latency for every
+# request, bucketed by URL name. Requests slower than METRICS_SLOW_REQUEST_MS are logged
+# together with the SQL they ran.
+class RequestMetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        request_metrics, token, started = self.start()
+        try:
+            with connection.execute_wrapper(request_metrics.db_wrapper):
+                response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.finish(request, request_metrics, started)
+        return response
+
+    async def __acall__(self, request):
+        request_metrics, token, started = self.start()
+        try:
+            with connection.execute_wrapper(request_metrics.db_wrapper):
+                response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.finish(request, request_metrics, started)
+        return response
+
+    def process_template_response(self, request, response):
+        request_metrics = current_request.get()
+        if request_metrics is not None:
+            started = time.perf_counter()
+
+            def rendered(response):
+                request_metrics.sections['render'] += time.perf_counter() - started
+
+            response.add_post_render_callback(rendered)
+        return response
+
+    def start(self):
+        request_metrics = RequestMetrics(capture_sql=settings.METRICS_SLOW_REQUEST_MS is not None)
+        return request_metrics, current_request.set(request_metrics), time.perf_counter()
+
+    def finish(self, request, request_metrics, started):
+        total = time.perf_counter() - started
+        match = request.resolver_match
+        route = match.url_name or match.view_name if match else 'unmatched'
+        registry.observe(route, request_metrics, total)
+
+        threshold = settings.METRICS_SLOW_REQUEST_MS
+        if threshold is not None and total * 1000 >= threshold:
+            logger.warning(
+                'Slow request %s %s (%s): %.1f ms, %d queries, %.1f ms in db\n%s',
+                request.method, request.path, route, total * 1000, request_metrics.queries,
+                request_metrics.sections['db'] * 1000, '\n'.join(request_metrics.sql),
+            )
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:15
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_counters(apps, schema_editor):
+    Comment = apps.get_model('app', 'Comment')
+    Like = apps.get_model('app', 'Like')
+    likes = Like.objects.filter(com_id=OuterRef('pk')).values('com_id').annotate(total=Count('pk')).values('total')
+    replies = Comment.objects.filter(parent=OuterRef('pk')).values('parent').annotate(total=Count('pk')).values('total')
+    Comment.objects.update(like_count=Coalesce(Subquery(likes), 0), reply_count=Coalesce(Subquery(replies), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0002_comment_parent_alter_comment_topic_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='reply_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
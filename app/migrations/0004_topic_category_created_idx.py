@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0003_comment_like_count_reply_count'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='topic',
+            index=models.Index(fields=['category', 'created_at', 'id'], name='topic_category_created_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:17
+
+from django.db import migrations, models
+
+from app.rendering import render_markdown
+
+
+def render_content(apps, schema_editor):
+    Topic = apps.get_model('app', 'Topic')
+    last_pk = 0
+    while topics := list(Topic.objects.filter(pk__gt=last_pk).order_by('pk').only('content')[:500]):
+        for topic in topics:
+            topic.content_html = render_markdown(topic.content)
+        Topic.objects.bulk_update(topics, ['content_html'])
+        last_pk = topics[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0004_topic_category_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='topic',
+            name='content_html',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(render_content, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+def create_index(apps, schema_editor):
+    from app.search import get_backend
+    backend = get_backend(schema_editor.connection)
+    for statement in backend.create_sql:
+        schema_editor.execute(statement)
+    backend.rebuild()
+
+
+def drop_index(apps, schema_editor):
+    from app.search import get_backend
+    for statement in get_backend(schema_editor.connection).drop_sql:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_topic_content_html'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:31
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, F, Min
+
+
+def remove_duplicate_likes(apps, schema_editor):
+    Comment = apps.get_model('app', 'Comment')
+    CustomUser = apps.get_model('app', 'CustomUser')
+    Like = apps.get_model('app', 'Like')
+    duplicates = (Like.objects.values('liked_by_id', 'com_id')
+                  .annotate(total=Count('id'), keep=Min('id')).filter(total__gt=1))
+    for row in list(duplicates):
+        extra = row['total'] - 1
+        Like.objects.filter(liked_by_id=row['liked_by_id'], com_id=row['com_id']).exclude(pk=row['keep']).delete()
+        # Every duplicate was counted and credited to the comment's author when it was created
+        author = Comment.objects.filter(pk=row['com_id']).values_list('user_id', flat=True).first()
+        Comment.objects.filter(pk=row['com_id']).update(like_count=F('like_count') - extra)
+        CustomUser.objects.filter(pk=author).update(rating=F('rating') - extra * Decimal('0.05'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0006_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_likes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='like',
+            constraint=models.UniqueConstraint(fields=('liked_by_id', 'com_id'), name='unique_like'),
+        ),
+    ]
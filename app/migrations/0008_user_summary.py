@@ -0,0 +1,50 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:36
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Greatest
+
+
+def populate_summaries(apps, schema_editor):
+    CustomUser = apps.get_model('app', 'CustomUser')
+    Topic = apps.get_model('app', 'Topic')
+    Comment = apps.get_model('app', 'Comment')
+    UserSummary = apps.get_model('app', 'UserSummary')
+
+    def subquery(queryset, field, aggregate):
+        return Subquery(queryset.values(field).annotate(total=aggregate).values('total'))
+
+    UserSummary.objects.bulk_create(UserSummary(user_id=pk) for pk in CustomUser.objects.values_list('pk', flat=True))
+    topics = Topic.objects.filter(created_by_id=OuterRef('pk'))
+    comments = Comment.objects.filter(user=OuterRef('pk'))
+    last_topic = subquery(topics, 'created_by_id', Max('created_at'))
+    last_comment = subquery(comments, 'user', Max('posted_at'))
+    UserSummary.objects.update(
+        topic_count=Coalesce(subquery(topics, 'created_by_id', Count('pk')), 0),
+        comment_count=Coalesce(subquery(comments, 'user', Count('pk')), 0),
+        likes_received=Coalesce(subquery(comments, 'user', Sum('like_count')), 0),
+        last_activity_at=Greatest(Coalesce(last_topic, last_comment), Coalesce(last_comment, last_topic)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0007_like_unique'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserSummary',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('topic_count', models.PositiveIntegerField(default=0)),
+                ('comment_count', models.PositiveIntegerField(default=0)),
+                ('likes_received', models.PositiveIntegerField(default=0)),
+                ('last_activity_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.RunPython(populate_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:40
+
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+from app.trending import HORIZON_HALF_LIVES, hot_score
+
+
+def populate_scores(apps, schema_editor):
+    # A batch of topics at a time, like trending.recompute, so only their comments are ever held in memory
+    Topic = apps.get_model('app', 'Topic')
+    Comment = apps.get_model('app', 'Comment')
+    now = timezone.now()
+    half_life = settings.HOT_SCORE_HALF_LIFE_HOURS * 3600
+    since = now - timedelta(seconds=half_life * HORIZON_HALF_LIVES)
+    last_pk = 0
+    while pks := list(Topic.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:500]):
+        activity = defaultdict(list)
+        rows = Comment.objects.filter(topic_id__in=pks, posted_at__gte=since)
+        for topic_id, posted_at, likes in rows.values_list('topic_id', 'posted_at', 'like_count'):
+            activity[topic_id].append((posted_at, likes))
+        topics = [
+            Topic(pk=pk, hot_score=hot_score(activity[pk], now, half_life, settings.HOT_SCORE_COMMENT_WEIGHT,
+                                             settings.HOT_SCORE_LIKE_WEIGHT))
+            for pk in activity
+        ]
+        Topic.objects.bulk_update(topics, ['hot_score'])
+        last_pk = pks[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_avatar_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='topic',
+            name='hot_score',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_scores, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='topic',
+            index=models.Index(fields=['-hot_score', '-id'], name='topic_hot_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='topic',
+            index=models.Index(fields=['category', '-hot_score', '-id'], name='topic_category_hot_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+
+def populate_stats(apps, schema_editor):
+    Category = apps.get_model('app', 'Category')
+    Topic = apps.get_model('app', 'Topic')
+    Comment = apps.get_model('app', 'Comment')
+
+    def subquery(queryset, field, aggregate):
+        return Subquery(queryset.values(field).annotate(total=aggregate).values('total'))
+
+    topics = Topic.objects.filter(category=OuterRef('pk'))
+    comments = Comment.objects.filter(topic_id__category=OuterRef('pk'))
+    last_topic = subquery(topics, 'category', Max('created_at'))
+    last_comment = subquery(comments, 'topic_id__category', Max('posted_at'))
+    Category.objects.update(
+        topic_count=Coalesce(subquery(topics, 'category', Count('pk')), 0),
+        comment_count=Coalesce(subquery(comments, 'topic_id__category', Count('pk')), 0),
+        last_topic=Subquery(topics.order_by('-created_at', '-id').values('pk')[:1]),
+        last_activity_at=Greatest(Coalesce(last_topic, last_comment), Coalesce(last_comment, last_topic)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_topic_hot_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='last_activity_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='last_topic',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='app.topic'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='topic_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(populate_stats, migrations.RunPython.noop),
+    ]
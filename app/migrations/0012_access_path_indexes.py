@@ -0,0 +1,57 @@
+# Generated by Django 4.2.30 on 2026-10-17 20:45
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_category_stats'),
+    ]
+
+    # The composite indexes exist before the single-column ones they replace are dropped
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['topic_id', 'posted_at', 'id'], name='comment_topic_posted_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='like',
+            index=models.Index(fields=['com_id', 'liked_by_id'], name='like_comment_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='topic',
+            index=models.Index(fields=['created_by_id', 'created_at', 'id'], name='topic_author_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='topic',
+            index=models.Index(fields=['created_at', 'id'], name='topic_created_idx'),
+        ),
+        migrations.AlterField(
+            model_name='comment',
+            name='topic_id',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='app.topic'),
+        ),
+        migrations.AlterField(
+            model_name='like',
+            name='com_id',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='app.comment'),
+        ),
+        migrations.AlterField(
+            model_name='like',
+            name='liked_by_id',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='topic',
+            name='category',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='app.category'),
+        ),
+        migrations.AlterField(
+            model_name='topic',
+            name='created_by_id',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+from app.rendering import sanitize_html
+
+
+def sanitize_content(apps, schema_editor):
+    Topic = apps.get_model('app', 'Topic')
+    last_pk = 0
+    while topics := list(Topic.objects.filter(pk__gt=last_pk).order_by('pk').only('content_html')[:500]):
+        for topic in topics:
+            topic.content_html = sanitize_html(topic.content_html)
+        Topic.objects.bulk_update(topics, ['content_html'])
+        last_pk = topics[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0013_comment_version'),
+    ]
+
+    operations = [
+        migrations.RunPython(sanitize_content, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def set_journal_mode(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f'PRAGMA journal_mode = {settings.SQLITE_JOURNAL_MODE}')
+
+
+class Migration(migrations.Migration):
+    # SQLite refuses to switch journal mode inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('app', '0014_sanitize_content_html'),
+    ]
+
+    operations = [
+        migrations.RunPython(set_journal_mode, migrations.RunPython.noop),
+    ]
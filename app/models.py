@@ -1,9 +1,13 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 
+from .rendering import render_markdown
+
 
 class CustomUser(AbstractUser):
     profile_picture = models.ImageField(upload_to='profile_pictures/', blank=True, null=True)
+    # Resized copies of profile_picture by width, plus the 'source' they were made from; see app.avatars
+    avatar_variants = models.JSONField(default=dict, blank=True, editable=False)
     rating = models.DecimalField(max_digits=5, decimal_places=2, default=0.0)
 
     def __str__(self):
@@ -12,34 +16,118 @@ class CustomUser(AbstractUser):
 
 class Category(models.Model):
     name = models.CharField(max_length=255)
+    # Denormalized for the category index, maintained by app.categories
+    topic_count = models.PositiveIntegerField(default=0, editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    last_topic = models.ForeignKey('Topic', null=True, blank=True, on_delete=models.SET_NULL, related_name='+',
+                                   editable=False)
+    last_activity_at = models.DateTimeField(null=True, blank=True, editable=False)
 
     def __str__(self):
         return self.name
 
 
+class TopicQuerySet(models.QuerySet):
+    listing_fields = ('title', 'created_at', 'category', 'category__name', 'created_by_id', 'created_by_id__username')
+
+    def with_authors(self):
+        return self.select_related('category', 'created_by_id')
+
+    def for_listing(self):
+        return self.with_authors().only(*self.listing_fields)
+
+    def for_detail(self):
+        return self.with_authors().only(*self.listing_fields, 'content', 'content_html')
+
+    def trending(self):
+        return self.with_authors().only(*self.listing_fields, 'hot_score').order_by('-hot_score', '-id')
+
+
 class Topic(models.Model):
-    created_by_id = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
+    # Foreign keys that lead a composite index below don't get an index of their own
+    created_by_id = models.ForeignKey(CustomUser, on_delete=models.CASCADE, db_index=False)
     title = models.CharField(max_length=255)
-    category = models.ForeignKey(Category, null=False, on_delete=models.CASCADE)
+    category = models.ForeignKey(Category, null=False, on_delete=models.CASCADE, db_index=False)
     content = models.TextField()
+    # Rendered from content on every save, so the read path never runs Markdown
+    content_html = models.TextField(blank=True, default='', editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now_add=True)
+    # Time-decayed comment and like activity, maintained by app.trending
+    hot_score = models.FloatField(default=0, editable=False)
+
+    objects = TopicQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['category', 'created_at', 'id'], name='topic_category_created_idx'),
+            models.Index(fields=['created_by_id', 'created_at', 'id'], name='topic_author_created_idx'),
+            models.Index(fields=['created_at', 'id'], name='topic_created_idx'),
+            models.Index(fields=['-hot_score', '-id'], name='topic_hot_idx'),
+            models.Index(fields=['category', '-hot_score', '-id'], name='topic_category_hot_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or 'content' in update_fields:
+            self.content_html = render_markdown(self.content)
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'content_html'}
+        super().save(*args, **kwargs)
+
+
+class CommentQuerySet(models.QuerySet):
+    def with_thread_data(self):
+        return self.select_related('user', 'parent__user')
+
 
 class Comment(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     content = models.TextField()
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
     posted_at = models.DateTimeField(auto_now_add=True)
-    topic_id = models.ForeignKey(Topic, null=False, on_delete=models.CASCADE)
+    topic_id = models.ForeignKey(Topic, null=False, on_delete=models.CASCADE, db_index=False)
+    # Denormalized from Like / Comment.parent, kept in sync with F() updates
+    like_count = models.PositiveIntegerField(default=0)
+    reply_count = models.PositiveIntegerField(default=0)
+    # Bumped whenever the rendered comment changes, so cached fragments are never stale
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    objects = CommentQuerySet.as_manager()
 
-    def like_count(self):
-        return self.like_set.count()
+    class Meta:
+        indexes = [
+            models.Index(fields=['topic_id', 'posted_at', 'id'], name='comment_topic_posted_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            self.version += 1
+            if kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'version'}
+        super().save(*args, **kwargs)
 
 
 class Like(models.Model):
-    liked_by_id = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
-    com_id = models.ForeignKey(Comment, null=False, on_delete=models.CASCADE)
+    liked_by_id = models.ForeignKey(CustomUser, on_delete=models.CASCADE, db_index=False)
+    com_id = models.ForeignKey(Comment, null=False, on_delete=models.CASCADE, db_index=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['liked_by_id', 'com_id'], name='unique_like'),
+        ]
+        indexes = [
+            models.Index(fields=['com_id', 'liked_by_id'], name='like_comment_user_idx'),
+        ]
+
+
+# Per-user activity counters for the profile page, kept current by app.summaries
+class UserSummary(models.Model):
+    user = models.OneToOneField(CustomUser, primary_key=True, on_delete=models.CASCADE, related_name='summary')
+    topic_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    likes_received = models.PositiveIntegerField(default=0)
+    last_activity_at = models.DateTimeField(null=True, blank=True)
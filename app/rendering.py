@@ -0,0 +1,35 @@
+import markdown
+import nh3
+from django.conf import settings
+
+# Everything the enabled Markdown extensions produce, minus anything that can run script: no
+# event handlers, no style or class, and links only to web and mail addresses
+ALLOWED_TAGS = {
+    'p', 'br', 'hr', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'strong', 'em', 'code', 'pre', 'blockquote',
+    'ul', 'ol', 'li', 'a', 'img', 'table', 'thead', 'tbody', 'tr', 'th', 'td', 'dl', 'dt', 'dd', 'abbr',
+    'sup', 'div',
+}
+ALLOWED_ATTRIBUTES = {
+    'a': {'href', 'title'},
+    'img': {'src', 'alt', 'title'},
+    'abbr': {'title'},
+    'th': {'align'},
+    'td': {'align'},
+    'ol': {'start'},
+}
+ALLOWED_URL_SCHEMES = {'http', 'https', 'mailto'}
+
+
+def sanitize_html(html):
+    return nh3.clean(html, tags=ALLOWED_TAGS, attributes=ALLOWED_ATTRIBUTES, url_schemes=ALLOWED_URL_SCHEMES)
+
+
+def render_markdown(text, extensions=None):
+    if extensions is None:
+        extensions = settings.MARKDOWN_EXTENSIONS
+    md = markdown.Markdown(extensions=extensions)
+    # Topic content is user input: raw HTML is escaped, and what extensions such as attr_list
+    # add to the output is filtered again before it is stored
+    md.preprocessors.deregister('html_block')
+    md.inlinePatterns.deregister('html')
+    return sanitize_html(md.convert(text))
@@ -0,0 +1,162 @@
+import re
+
+from django.db import connection as default_connection
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+KINDS = ('topic', 'comment')
+
+
+def document_id(kind, pk):
+    # Topics and comments share one index, so their ids are interleaved into a single key
+    return pk * 2 + KINDS.index(kind)
+
+
+class SearchBackend:
+    table = 'app_search_index'
+    create_sql = []
+    drop_sql = []
+    insert_sql = None
+    # Each takes a (low, high] id range and copies that slice of app_topic / app_comment into the index
+    topic_backfill_sql = None
+    comment_backfill_sql = None
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def to_query(self, text):
+        raise NotImplementedError
+
+    def search_sql(self, category_id):
+        raise NotImplementedError
+
+    def insert_params(self, kind, pk, topic_id, title, body):
+        return [document_id(kind, pk), kind, pk, topic_id, title, body]
+
+    def index(self, kind, pk, topic_id, title, body, created=False):
+        with self.connection.cursor() as cursor:
+            if not created:
+                cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [document_id(kind, pk)])
+            cursor.execute(self.insert_sql, self.insert_params(kind, pk, topic_id, title, body))
+
+    def index_topic(self, topic, created=False):
+        self.index('topic', topic.pk, topic.pk, topic.title, topic.content, created)
+
+    def index_comment(self, comment, created=False):
+        self.index('comment', comment.pk, comment.topic_id_id, '', comment.content, created)
+
+    def remove(self, kind, pk):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table} WHERE rowid = %s', [document_id(kind, pk)])
+
+    def search(self, text, category_id=None, limit=20, offset=0):
+        query = self.to_query(text)
+        if not query:
+            return []
+        params = [query] + ([category_id] if category_id is not None else []) + [limit, offset]
+        with self.connection.cursor() as cursor:
+            cursor.execute(self.search_sql(category_id), params)
+            columns = [col[0] for col in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    def rebuild(self, chunk_size=None):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {self.table}')
+            for source, sql in (('app_topic', self.topic_backfill_sql), ('app_comment', self.comment_backfill_sql)):
+                cursor.execute(f'SELECT MIN(id), MAX(id) FROM {source}')
+                low, high = cursor.fetchone()
+                if low is None:
+                    continue
+                step = chunk_size or high - low + 1
+                for start in range(low - 1, high, step):
+                    cursor.execute(sql, [start, start + step])
+            cursor.execute(f'SELECT COUNT(*) FROM {self.table}')
+            return cursor.fetchone()[0]
+
+
+class SQLiteSearchBackend(SearchBackend):
+    create_sql = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS app_search_index USING fts5("
+        "kind UNINDEXED, object_id UNINDEXED, topic_id UNINDEXED, title, body, "
+        "tokenize = 'unicode61 remove_diacritics 2')",
+    ]
+    drop_sql = ['DROP TABLE IF EXISTS app_search_index']
+    insert_sql = ('INSERT INTO app_search_index (rowid, kind, object_id, topic_id, title, body) '
+                  'VALUES (%s, %s, %s, %s, %s, %s)')
+    topic_backfill_sql = ("INSERT INTO app_search_index (rowid, kind, object_id, topic_id, title, body) "
+                          "SELECT id * 2, 'topic', id, id, title, content FROM app_topic "
+                          "WHERE id > %s AND id <= %s")
+    comment_backfill_sql = ("INSERT INTO app_search_index (rowid, kind, object_id, topic_id, title, body) "
+                            "SELECT id * 2 + 1, 'comment', id, topic_id_id, '', content FROM app_comment "
+                            "WHERE id > %s AND id <= %s")
+
+    def to_query(self, text):
+        # Quote every token so user input can't use FTS5 query syntax; the last one matches as a prefix
+        tokens = [f'"{token}"' for token in TOKEN_RE.findall(text)]
+        if tokens:
+            tokens[-1] += '*'
+        return ' '.join(tokens)
+
+    def search_sql(self, category_id):
+        category_filter = 'AND t.category_id = %s' if category_id is not None else ''
+        return f'''
+            SELECT app_search_index.kind, app_search_index.object_id AS id, app_search_index.topic_id,
+                   t.title, t.category_id,
+                   snippet(app_search_index, 4, '', '', '…', 16) AS snippet,
+                   bm25(app_search_index, 0, 0, 0, 4.0, 1.0) AS rank
+            FROM app_search_index JOIN app_topic t ON t.id = app_search_index.topic_id
+            WHERE app_search_index MATCH %s {category_filter}
+            ORDER BY rank
+            LIMIT %s OFFSET %s
+        '''
+
+
+class PostgresSearchBackend(SearchBackend):
+    document_sql = "setweight(to_tsvector('simple', {title}), 'A') || setweight(to_tsvector('simple', {body}), 'B')"
+    create_sql = [
+        'CREATE TABLE IF NOT EXISTS app_search_index ('
+        'rowid bigint PRIMARY KEY, kind varchar(16) NOT NULL, object_id bigint NOT NULL, '
+        'topic_id bigint NOT NULL, title text NOT NULL, body text NOT NULL, document tsvector NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS app_search_index_document ON app_search_index USING gin (document)',
+    ]
+    drop_sql = ['DROP TABLE IF EXISTS app_search_index']
+    insert_sql = ('INSERT INTO app_search_index (rowid, kind, object_id, topic_id, title, body, document) '
+                  'VALUES (%s, %s, %s, %s, %s, %s, ' + document_sql.format(title='%s', body='%s') + ')')
+    topic_backfill_sql = ("INSERT INTO app_search_index (rowid, kind, object_id, topic_id, title, body, document) "
+                          "SELECT id * 2, 'topic', id, id, title, content, "
+                          + document_sql.format(title='title', body='content') +
+                          " FROM app_topic WHERE id > %s AND id <= %s")
+    comment_backfill_sql = ("INSERT INTO app_search_index (rowid, kind, object_id, topic_id, title, body, document) "
+                            "SELECT id * 2 + 1, 'comment', id, topic_id_id, '', content, "
+                            + document_sql.format(title="''", body='content') +
+                            " FROM app_comment WHERE id > %s AND id <= %s")
+
+    def insert_params(self, kind, pk, topic_id, title, body):
+        return super().insert_params(kind, pk, topic_id, title, body) + [title, body]
+
+    def to_query(self, text):
+        return ' '.join(TOKEN_RE.findall(text))
+
+    def search_sql(self, category_id):
+        category_filter = 'AND t.category_id = %s' if category_id is not None else ''
+        return f'''
+            SELECT s.kind, s.object_id AS id, s.topic_id, t.title, t.category_id,
+                   ts_headline('simple', s.body, q.query) AS snippet,
+                   -ts_rank(s.document, q.query) AS rank
+            FROM app_search_index s
+            JOIN app_topic t ON t.id = s.topic_id
+            CROSS JOIN (SELECT websearch_to_tsquery('simple', %s) AS query) q
+            WHERE s.document @@ q.query {category_filter}
+            ORDER BY rank
+            LIMIT %s OFFSET %s
+        '''
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearchBackend,
+    'postgresql': PostgresSearchBackend,
+}
+
+
+def get_backend(connection=None):
+    connection = connection or default_connection
+    return BACKENDS[connection.vendor](connection)
@@ -1,9 +1,27 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
 from .models import CustomUser, Comment
 
 
-from .models import Topic
+from .models import Category, Topic
+from .metrics import timed
+from .avatars import too_many_pixels
+
+
+# Serializer time is reported by RequestMetricsMiddleware; nested serializers are counted once
+class TimedListSerializer(serializers.ListSerializer):
+    @property
+    def data(self):
+        with timed('serializer'):
+            return super().data
+
+
+class TimedModelSerializer(serializers.ModelSerializer):
+    @property
+    def data(self):
+        with timed('serializer'):
+            return super().data
 
 
 # class UserSerializer(serializers.ModelSerializer):
@@ -21,11 +39,12 @@ from .models import Topic
 #         return user
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedModelSerializer):
     class Meta:
         model = CustomUser
         fields = ('username', 'email', 'password')
         extra_kwargs = {'password': {'write_only': True}}
+        list_serializer_class = TimedListSerializer
 
     def create(self, validated_data):
         user = CustomUser.objects.create(
@@ -37,37 +56,114 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
 
-class TopicSerializer(serializers.ModelSerializer):
+class TopicSerializer(TimedModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
     created_by_username = serializers.CharField(source='created_by_id.username', read_only=True)
     formatted_created_at = serializers.SerializerMethodField()
 
-    created_by_id = serializers.IntegerField(source='created_by.id', read_only=True)
-    category_id = serializers.ReadOnlyField(source='category.id')
+    created_by_id = serializers.ReadOnlyField(source='created_by_id_id')
+    category_id = serializers.ReadOnlyField()
 
     class Meta:
         model = Topic
         fields = [
-            'pk', 'title', 'content', 'category_name', 'created_by_username',
+            'pk', 'title', 'content', 'content_html', 'category', 'category_name', 'created_by_username',
             'formatted_created_at', 'created_by_id', 'category_id'
         ]
-
-    def to_representation(self, instance):
-        representation = super().to_representation(instance)
-        representation['created_by_id'] = instance.created_by_id.id
-        representation['category_id'] = instance.category.id
-        return representation
+        extra_kwargs = {'category': {'write_only': True}}
+        list_serializer_class = TimedListSerializer
 
     def get_formatted_created_at(self, obj):
-        print(f"Debug: Created by ID = {obj.created_by_id.id}, Category ID = {obj.category.id}")
         return obj.created_at.strftime('%d.%m.%y %H:%M')
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class TopicSummarySerializer(TopicSerializer):
+    class Meta(TopicSerializer.Meta):
+        fields = [
+            'pk', 'title', 'category_name', 'created_by_username',
+            'formatted_created_at', 'created_by_id', 'category_id'
+        ]
+
+
+class TrendingTopicSerializer(TopicSummarySerializer):
+    class Meta(TopicSummarySerializer.Meta):
+        fields = TopicSummarySerializer.Meta.fields + ['hot_score']
+
+
+class CategorySerializer(TimedModelSerializer):
+    last_topic = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Category
+        fields = ['pk', 'name', 'topic_count', 'comment_count', 'last_activity_at', 'last_topic']
+        list_serializer_class = TimedListSerializer
+
+    def get_last_topic(self, obj):
+        topic = obj.last_topic
+        if topic is None:
+            return None
+        return {
+            'pk': topic.pk,
+            'title': topic.title,
+            'created_by_id': topic.created_by_id_id,
+            'created_by_username': topic.created_by_id.username,
+            'created_at': topic.created_at,
+        }
+
+
+class CommentSerializer(TimedModelSerializer):
     user_username = serializers.ReadOnlyField(source='user.username')
     like_count = serializers.ReadOnlyField()
-    topic_id = serializers.PrimaryKeyRelatedField(queryset=Topic.objects.all())
+    reply_count = serializers.ReadOnlyField()
+    topic_id = serializers.PrimaryKeyRelatedField(read_only=True)
+    liked_by_me = serializers.SerializerMethodField()
 
     class Meta:
         model = Comment
-        fields = ['id', 'user_username', 'content', 'posted_at', 'like_count', 'parent', 'topic_id']
\ No newline at end of file
+        fields = [
+            'id', 'user_username', 'content', 'posted_at', 'like_count', 'reply_count', 'liked_by_me', 'parent',
+            'topic_id'
+        ]
+        # parent and topic_id come from the URL and are resolved by CreateCommentView, not by field validation
+        read_only_fields = ['parent']
+        list_serializer_class = TimedListSerializer
+
+    def get_liked_by_me(self, obj):
+        # Views pass the viewer's liked ids for the whole page, resolved in one query
+        return obj.pk in self.context.get('liked_comment_ids', ())
+
+
+class CommentTreeSerializer(CommentSerializer):
+    depth = serializers.ReadOnlyField()
+    replies = serializers.SerializerMethodField()
+    hidden_replies = serializers.ReadOnlyField()
+
+    class Meta(CommentSerializer.Meta):
+        fields = CommentSerializer.Meta.fields + ['depth', 'replies', 'hidden_replies']
+
+    def get_replies(self, obj):
+        return CommentTreeSerializer(obj.thread_replies, many=True, context=self.context).data
+
+
+class LikeStateSerializer(serializers.Serializer):
+    comment_id = serializers.IntegerField(min_value=1)
+    liked = serializers.BooleanField()
+
+
+class LikeBatchSerializer(serializers.Serializer):
+    likes = LikeStateSerializer(many=True, allow_empty=False, max_length=settings.LIKE_BATCH_SIZE)
+
+
+class ProfilePictureSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = CustomUser
+        fields = ['profile_picture']
+        extra_kwargs = {'profile_picture': {'required': True, 'allow_null': False}}
+
+    def validate_profile_picture(self, value):
+        if value.size > settings.AVATAR_MAX_UPLOAD_BYTES:
+            raise serializers.ValidationError('The picture is too large.')
+        # ImageField leaves the header-only Pillow image on the upload
+        if too_many_pixels(value.image):
+            raise serializers.ValidationError('The picture has too many pixels.')
+        return value
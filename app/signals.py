@@ -0,0 +1,135 @@
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from .cache import invalidate
+from .auth import revoke_user, user_cache
+from . import avatars, categories, summaries, trending
+from .models import Category, CustomUser, Topic, Comment, UserSummary
+from .search import get_backend
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in settings.SQLITE_PRAGMAS.items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
+
+
+@receiver([post_save, post_delete], sender=CustomUser)
+def user_changed(sender, instance, **kwargs):
+    user_cache.evict(instance.pk)
+
+
+@receiver(post_save, sender=CustomUser)
+def revoke_tokens(sender, instance, created, **kwargs):
+    # set_password() keeps the raw password in _password until save() has stored the hash
+    if not created and (instance._password is not None or not instance.is_active):
+        revoke_user(instance.pk)
+
+
+@receiver(post_save, sender=CustomUser)
+def create_user_summary(sender, instance, created, **kwargs):
+    if created:
+        UserSummary.objects.create(user=instance)
+
+
+@receiver(post_save, sender=CustomUser)
+def process_profile_picture(sender, instance, **kwargs):
+    if avatars.needs_processing(instance):
+        transaction.on_commit(partial(avatars.schedule, instance.pk))
+
+
+@receiver(pre_save, sender=Topic)
+def remember_category(sender, instance, update_fields=None, **kwargs):
+    # Read back from the database, since callers may build the instance without loading it
+    instance._previous_category_id = None
+    if not instance._state.adding and (update_fields is None or 'category' in update_fields):
+        instance._previous_category_id = (Topic.objects.filter(pk=instance.pk)
+                                          .values_list('category_id', flat=True).first())
+
+
+def moved_from(topic):
+    previous = getattr(topic, '_previous_category_id', None)
+    return previous if previous not in (None, topic.category_id) else None
+
+
+@receiver([post_save, post_delete], sender=Topic)
+def topic_changed(sender, instance, **kwargs):
+    category_ids = {instance.category_id, moved_from(instance)} - {None}
+    invalidate('topics', 'category-index', f'topic:{instance.pk}', *(f'category:{pk}' for pk in category_ids))
+    cache.delete_many([f'topic-count:{pk}' for pk in category_ids])
+
+
+@receiver([post_save, post_delete], sender=Category)
+def category_changed(sender, instance, **kwargs):
+    invalidate('categories', 'category-index', f'category:{instance.pk}')
+
+
+@receiver([post_save, post_delete], sender=Comment)
+def comment_changed(sender, instance, **kwargs):
+    invalidate(f'comments:{instance.topic_id_id}')
+
+
+@receiver(post_save, sender=Topic)
+def index_topic(sender, instance, created, **kwargs):
+    get_backend().index_topic(instance, created)
+
+
+@receiver(post_save, sender=Comment)
+def index_comment(sender, instance, created, **kwargs):
+    get_backend().index_comment(instance, created)
+
+
+@receiver(post_delete, sender=Topic)
+def unindex_topic(sender, instance, **kwargs):
+    get_backend().remove('topic', instance.pk)
+
+
+@receiver(post_delete, sender=Comment)
+def unindex_comment(sender, instance, **kwargs):
+    get_backend().remove('comment', instance.pk)
+
+
+@receiver(post_save, sender=Topic)
+def count_topic(sender, instance, created, **kwargs):
+    if created:
+        summaries.record_post(instance.created_by_id_id, 'topic_count', instance.created_at)
+        categories.record_topic(instance)
+    elif previous := moved_from(instance):
+        categories.record_topic_move(previous, instance)
+
+
+@receiver(post_delete, sender=Topic)
+def uncount_topic(sender, instance, **kwargs):
+    summaries.record_removal(instance.created_by_id_id, 'topic_count')
+    categories.record_topic_removal(instance)
+
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, **kwargs):
+    if created:
+        summaries.record_post(instance.user_id, 'comment_count', instance.posted_at)
+        trending.record_activity(instance.topic_id_id, settings.HOT_SCORE_COMMENT_WEIGHT)
+        categories.record_comment(instance)
+        invalidate('category-index')
+
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    summaries.record_removal(instance.user_id, 'comment_count', likes=instance.like_count)
+    if instance.parent_id:
+        # A no-op when the parent is going in the same cascade
+        Comment.objects.filter(pk=instance.parent_id, reply_count__gt=0).update(reply_count=F('reply_count') - 1)
+    trending.record_activity(instance.topic_id_id, -(settings.HOT_SCORE_COMMENT_WEIGHT
+                                                     + settings.HOT_SCORE_LIKE_WEIGHT * instance.like_count))
+    categories.record_comment_removal(instance)
+    invalidate('category-index')
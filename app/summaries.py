@@ -0,0 +1,45 @@
+from django.db.models import Count, F, Max, OuterRef, Sum
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .aggregates import latest, subquery
+from .models import Comment, CustomUser, Topic, UserSummary
+
+
+def record_post(user_id, field, posted_at=None):
+    # Called for every new topic or comment; the summary row exists from the moment the user does
+    UserSummary.objects.filter(pk=user_id).update(**{
+        field: F(field) + 1,
+        'last_activity_at': posted_at or timezone.now(),
+    })
+
+
+def record_removal(user_id, field, likes=0):
+    # Clamped at zero: a summary that drifted must not make the delete itself fail
+    changes = {field: Greatest(F(field) - 1, 0)}
+    if likes:
+        changes['likes_received'] = Greatest(F('likes_received') - likes, 0)
+    UserSummary.objects.filter(pk=user_id).update(**changes)
+
+
+def rebuild(chunk_size=1000):
+    last_pk = 0
+    rebuilt = 0
+    while True:
+        pks = list(CustomUser.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            break
+        UserSummary.objects.bulk_create((UserSummary(user_id=pk) for pk in pks), ignore_conflicts=True)
+
+        topics = Topic.objects.filter(created_by_id=OuterRef('pk'))
+        comments = Comment.objects.filter(user=OuterRef('pk'))
+        last_topic = subquery(topics, 'created_by_id', Max('created_at'))
+        last_comment = subquery(comments, 'user', Max('posted_at'))
+        rebuilt += UserSummary.objects.filter(pk__in=pks).update(
+            topic_count=Coalesce(subquery(topics, 'created_by_id', Count('pk')), 0),
+            comment_count=Coalesce(subquery(comments, 'user', Count('pk')), 0),
+            likes_received=Coalesce(subquery(comments, 'user', Sum('like_count')), 0),
+            last_activity_at=latest(last_topic, last_comment),
+        )
+        last_pk = pks[-1]
+    return rebuilt
@@ -1,3 +1,1018 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import tempfile
+from decimal import Decimal
+from io import BytesIO, StringIO
+from unittest import skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+from rest_framework.test import APIClient, APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import benchmarks
+from .async_views import encode_cursor
+from .auth import ForumRefreshToken
+from .avatars import render_variants
+from .benchmarks.data import generate
+from .benchmarks.plans import explain, model_tables, plan_problems
+from .cache import cache_stats
+from .events import get_broker, topic_event_stream
+from .likes import toggle_like
+from .management.commands.import_forum import ImportState
+from .metrics import registry as metrics_registry
+from .models import CustomUser, Category, Topic, Comment, Like, UserSummary
+from .rendering import render_markdown
+from .search import get_backend as get_search_backend
+from .throttles import CacheBuckets, get_buckets, refill
+
+
+def make_thread(topic, users, size):
+    comments = []
+    for i in range(size):
+        parent = comments[-1] if comments and i % 2 else None
+        comment = Comment.objects.create(user=users[i % len(users)], content=f'comment {i}',
+                                         parent=parent, topic_id=topic, like_count=1)
+        Like.objects.create(liked_by_id=users[(i + 1) % len(users)], com_id=comment)
+        comments.append(comment)
+    return comments
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class CommentsViewQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [CustomUser.objects.create(username=f'user{i}') for i in range(3)]
+        category = Category.objects.create(name='General')
+        cls.small = Topic.objects.create(created_by_id=cls.users[0], title='small', category=category, content='')
+        cls.large = Topic.objects.create(created_by_id=cls.users[0], title='large', category=category, content='')
+        make_thread(cls.small, cls.users, 2)
+        make_thread(cls.large, cls.users, 30)
+
+    def render_thread(self, topic):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('topic_comments', kwargs={'topic_id': topic.pk}))
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_thread_render_does_not_scale_with_comment_count(self):
+        _, small_queries = self.render_thread(self.small)
+        response, large_queries = self.render_thread(self.large)
+        self.assertEqual(small_queries, large_queries)
+        self.assertContains(response, 'Лайки: 1', count=30)
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class CommentFragmentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [CustomUser.objects.create(username=f'user{i}') for i in range(3)]
+        category = Category.objects.create(name='General')
+        cls.topic = Topic.objects.create(created_by_id=cls.users[0], title='t', category=category, content='')
+        cls.comments = make_thread(cls.topic, cls.users, 5)
+        cls.url = reverse('topic_comments', kwargs={'topic_id': cls.topic.pk})
+
+    def test_only_changed_comments_are_rendered_again(self):
+        with self.assertTemplateUsed('comment_partial.html', count=5):
+            self.client.get(self.url)
+        Comment.objects.create(user=self.users[0], content='new', topic_id=self.topic)
+        with self.assertTemplateUsed('comment_partial.html', count=1):
+            self.client.get(self.url)
+        toggle_like(self.users[0].pk, self.comments[4])
+        with self.assertTemplateUsed('comment_partial.html', count=1):
+            response = self.client.get(self.url)
+        self.assertContains(response, 'Лайки: 2', count=1)
+
+    def test_replies_and_likes_on_a_parent_render_one_fragment(self):
+        parent = self.comments[0]
+        self.client.get(self.url)
+        api = APIClient()
+        api.force_authenticate(self.users[1])
+        api.post(reverse('create_comment', kwargs={'topic_id': self.topic.pk}),
+                 {'content': 'reply', 'parent': parent.pk, 'topic_id': self.topic.pk})
+        with self.assertTemplateUsed('comment_partial.html', count=1):
+            self.client.get(self.url)
+        toggle_like(self.users[2].pk, parent)
+        with self.assertTemplateUsed('comment_partial.html', count=1):
+            self.client.get(self.url)
+
+    def test_template_mode_renders_the_same_markup(self):
+        fragments = self.client.get(self.url).content.decode()
+        with override_settings(COMMENT_RENDER_MODE='template'):
+            template = self.client.get(self.url).content.decode()
+        self.assertEqual(''.join(fragments.split()), ''.join(template.split()))
+
+
+class CommentCountersTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = CustomUser.objects.create(username='author')
+        cls.reader = CustomUser.objects.create(username='reader')
+        category = Category.objects.create(name='General')
+        cls.topic = Topic.objects.create(created_by_id=cls.author, title='topic', category=category, content='')
+        cls.comment = Comment.objects.create(user=cls.author, content='root', topic_id=cls.topic)
+
+    def setUp(self):
+        self.client.force_authenticate(self.reader)
+
+    def toggle_like(self):
+        return self.client.post(reverse('like_comment', kwargs={'comment_id': self.comment.pk}))
+
+    def test_like_toggle_updates_counter_and_rating(self):
+        self.assertEqual(self.toggle_like().status_code, 201)
+        self.comment.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(self.comment.like_count, 1)
+        self.assertEqual(self.author.rating, Decimal('0.05'))
+
+        self.assertEqual(self.toggle_like().status_code, 204)
+        self.comment.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual(self.comment.like_count, 0)
+        self.assertEqual(self.author.rating, Decimal('0'))
+        self.assertFalse(Like.objects.exists())
+
+    def test_reply_increments_parent_reply_count(self):
+        response = self.client.post(reverse('create_comment', kwargs={'topic_id': self.topic.pk}),
+                                    {'content': 'reply', 'parent': self.comment.pk, 'topic_id': self.topic.pk})
+        self.assertEqual(response.status_code, 200)
+        self.comment.refresh_from_db()
+        self.assertEqual((self.comment.reply_count, self.comment.version), (1, 1))
+
+    def test_deleting_a_reply_decrements_parent_reply_count(self):
+        Comment.objects.filter(pk=self.comment.pk).update(reply_count=1)
+        Comment.objects.create(user=self.reader, content='reply', parent=self.comment, topic_id=self.topic).delete()
+        self.comment.refresh_from_db()
+        self.assertEqual(self.comment.reply_count, 0)
+
+    def test_rebuild_command_restores_counters(self):
+        Comment.objects.create(user=self.reader, content='reply', parent=self.comment, topic_id=self.topic)
+        Like.objects.create(liked_by_id=self.reader, com_id=self.comment)
+        call_command('rebuild_comment_counters', chunk_size=1, stdout=StringIO())
+        self.comment.refresh_from_db()
+        self.assertEqual((self.comment.like_count, self.comment.reply_count), (1, 1))
+        self.assertEqual(self.comment.version, 2)
+
+
+class LikeBatchTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors = [CustomUser.objects.create(username=f'author{i}') for i in range(2)]
+        cls.reader = CustomUser.objects.create(username='reader')
+        category = Category.objects.create(name='General')
+        topic = Topic.objects.create(created_by_id=cls.authors[0], title='topic', category=category, content='')
+        cls.comments = [Comment.objects.create(user=cls.authors[i % 2], content=f'comment {i}', topic_id=topic)
+                        for i in range(6)]
+
+    def setUp(self):
+        self.client.force_authenticate(self.reader)
+
+    def send(self, states):
+        likes = [{'comment_id': comment.pk, 'liked': liked} for comment, liked in states]
+        return self.client.post(reverse('like_comments'), {'likes': likes}, format='json')
+
+    def test_batch_is_idempotent_and_aggregates_ratings(self):
+        states = [(comment, True) for comment in self.comments]
+        # Two reads, one INSERT and one UPDATE per counter table, inside a savepoint pair
+        with self.assertNumQueries(9):
+            self.assertEqual(self.send(states).status_code, 200)
+        response = self.send(states)
+        self.assertFalse(any(result['changed'] for result in response.data['results']))
+
+        self.assertEqual(Like.objects.filter(liked_by_id=self.reader).count(), 6)
+        self.assertEqual([user.rating for user in CustomUser.objects.filter(pk__in=[a.pk for a in self.authors])],
+                         [Decimal('0.15'), Decimal('0.15')])
+
+        self.send([(self.comments[0], False), (self.comments[1], False)])
+        self.assertEqual(sorted(Comment.objects.values_list('like_count', flat=True)), [0, 0, 1, 1, 1, 1])
+        self.assertEqual(CustomUser.objects.get(pk=self.authors[0].pk).rating, Decimal('0.10'))
+
+    def test_liked_state_is_resolved_once_per_topic(self):
+        cache.clear()
+        self.client.force_authenticate(None)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {ForumRefreshToken.for_user(self.reader).access_token}')
+        topic_id = self.comments[0].topic_id_id
+        self.send([(self.comments[0], True)])
+        url = reverse('topic_comments', kwargs={'topic_id': topic_id})
+        self.assertContains(self.client.get(url), 'aria-pressed="true"', count=1)
+        # Only the thread itself; the liked set now comes from the cache
+        with self.assertNumQueries(1):
+            self.client.get(url)
+
+        self.send([(self.comments[1], True)])
+        tree = self.client.get(reverse('topic_comment_tree', kwargs={'topic_id': topic_id}), HTTP_ACCEPT='application/json')
+        liked = [comment['id'] for comment in tree.data['comments'] if comment['liked_by_me']]
+        self.assertEqual(liked, [self.comments[0].pk, self.comments[1].pk])
+
+    def test_unknown_comment_rejects_the_whole_batch(self):
+        response = self.client.post(reverse('like_comments'), {'likes': [
+            {'comment_id': self.comments[0].pk, 'liked': True}, {'comment_id': 999999, 'liked': True},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.data['comment_ids'], [999999])
+        self.assertFalse(Like.objects.exists())
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class TopicCursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = CustomUser.objects.create(username='author')
+        cls.category = Category.objects.create(name='General')
+        for i in range(12):
+            Topic.objects.create(created_by_id=author, title=f'topic {i}', category=cls.category, content='')
+
+    def fetch(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(ctx.captured_queries)
+
+    def test_deep_pages_cost_the_same_as_the_first(self):
+        url = reverse('topic-list-by-category', kwargs={'category_pk': self.category.pk})
+        first, _ = self.fetch(url)
+        first, first_queries = self.fetch(url)
+        second, second_queries = self.fetch(first.data['links']['next'])
+        third, third_queries = self.fetch(second.data['links']['next'])
+
+        self.assertEqual(first_queries, second_queries)
+        self.assertEqual(second_queries, third_queries)
+        self.assertEqual(first.data['count'], 12)
+        titles = [topic['title'] for page in (first, second, third) for topic in page.data['topics']]
+        self.assertEqual(titles, [f'topic {i}' for i in range(11, -1, -1)])
+        self.assertIsNone(third.data['links']['next'])
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class TopicListQueryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='News')
+        for i in range(6):
+            author = CustomUser.objects.create(username=f'author{i}')
+            Topic.objects.create(created_by_id=author, title=f'topic {i}', category=cls.category, content='')
+
+    def assert_queries(self, expected, url):
+        with self.assertNumQueries(expected):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_topic_pages_load_related_rows_up_front(self):
+        self.assert_queries(1, reverse('topic-list'))
+        self.assert_queries(1, reverse('topic-detail', kwargs={'pk': Topic.objects.first().pk}))
+        response = self.assert_queries(1, reverse('last-news'))
+        self.assertContains(response, 'author5')
+
+    def test_serialization_benchmark_is_a_single_query(self):
+        out = StringIO()
+        call_command('benchmark', 'topic_serialization', stdout=out)
+        result = json.loads(out.getvalue())[0]
+        self.assertEqual(result['topics'], 1000)
+        self.assertEqual(result['queries'], 1)
+
+
+class TopicContentRenderingTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = CustomUser.objects.create(username='author')
+        cls.category = Category.objects.create(name='General')
+
+    def test_content_is_rendered_once_on_save(self):
+        self.client.force_authenticate(self.author)
+        response = self.client.post(reverse('create_topic'), {
+            'title': 'Markdown', 'content': '**bold** <script>x</script>', 'category': self.category.pk,
+        })
+        self.assertContains(response, '<strong>bold</strong>')
+        self.assertNotContains(response, '<script>')
+
+        topic = Topic.objects.get()
+        topic.content = '*edited*'
+        topic.save(update_fields=['content'])
+        response = self.client.get(reverse('topic-detail', kwargs={'pk': topic.pk}))
+        self.assertContains(response, '<em>edited</em>')
+
+    def test_script_vectors_are_stripped(self):
+        payloads = ['[x](javascript:alert(1))', '# T {: onmouseover="alert(1)" }', 'para\n{: onclick="alert(1)" }',
+                    '![i](data:text/html;base64,PHNjcmlwdD4=)']
+        for payload in payloads:
+            html = render_markdown(payload)
+            for marker in ('javascript:', 'onmouseover', 'onclick', 'data:'):
+                self.assertNotIn(marker, html, payload)
+        self.assertIn('href="https://example.com"', render_markdown('[ok](https://example.com)'))
+
+    def test_render_command_refreshes_stored_html(self):
+        topic = Topic.objects.create(created_by_id=self.author, title='t', category=self.category, content='# Title')
+        Topic.objects.filter(pk=topic.pk).update(content_html='')
+        call_command('render_topic_content', processes=1, stdout=StringIO())
+        topic.refresh_from_db()
+        self.assertEqual(topic.content_html, '<h1>Title</h1>')
+
+
+class ResponseCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = CustomUser.objects.create(username='author')
+        cls.category = Category.objects.create(name='General')
+        cls.topic = Topic.objects.create(created_by_id=cls.author, title='cached', category=cls.category, content='')
+
+    def test_pages_are_served_from_cache_until_a_topic_changes(self):
+        url = reverse('topic-detail', kwargs={'pk': self.topic.pk})
+        before = cache_stats().get('TopicDetailView', {'hits': 0, 'misses': 0})
+        self.assertContains(self.client.get(url), 'cached')
+        with self.assertNumQueries(0):
+            self.assertContains(self.client.get(url), 'cached')
+
+        self.topic.title = 'renamed'
+        self.topic.save()
+        self.assertContains(self.client.get(url), 'renamed')
+
+        after = cache_stats()['TopicDetailView']
+        self.assertEqual(after['hits'] - before['hits'], 1)
+        self.assertEqual(after['misses'] - before['misses'], 2)
+
+    def test_comment_threads_are_invalidated_by_new_comments(self):
+        url = reverse('topic_comments', kwargs={'topic_id': self.topic.pk})
+        self.assertNotContains(self.client.get(url), 'fresh comment')
+        Comment.objects.create(user=self.author, content='fresh comment', topic_id=self.topic)
+        self.assertContains(self.client.get(url), 'fresh comment')
+
+
+class CommentTreeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(username='author')
+        category = Category.objects.create(name='General')
+        cls.topic = Topic.objects.create(created_by_id=cls.user, title='tree', category=category, content='')
+        cls.root = cls.comment('root')
+        cls.child = cls.comment('child', cls.root)
+        cls.grandchild = cls.comment('grandchild', cls.child)
+        cls.comment('second child', cls.root)
+        cls.comment('other root')
+
+    @classmethod
+    def comment(cls, content, parent=None):
+        comment = Comment.objects.create(user=cls.user, content=content, parent=parent, topic_id=cls.topic)
+        if parent:
+            Comment.objects.filter(pk=parent.pk).update(reply_count=F('reply_count') + 1)
+        return comment
+
+    def test_topic_tree_is_built_from_one_query(self):
+        url = reverse('topic_comment_tree', kwargs={'topic_id': self.topic.pk})
+        with self.assertNumQueries(1):
+            data = self.client.get(url, {'format': 'json'}).json()
+        self.assertEqual([c['content'] for c in data['comments']], ['root', 'other root'])
+        root = data['comments'][0]
+        self.assertEqual([c['content'] for c in root['replies']], ['child', 'second child'])
+        self.assertEqual(root['replies'][0]['replies'][0]['content'], 'grandchild')
+
+        response = self.client.get(url)
+        self.assertContains(response, 'grandchild')
+
+    def test_depth_and_reply_limits(self):
+        url = reverse('topic_comment_tree', kwargs={'topic_id': self.topic.pk})
+        data = self.client.get(url, {'format': 'json', 'depth': 1, 'replies': 1}).json()
+        self.assertEqual(len(data['comments']), 1)
+        self.assertEqual(data['remaining'], 1)
+        self.assertEqual(data['comments'][0]['replies'], [])
+        self.assertEqual(data['comments'][0]['hidden_replies'], 2)
+
+    def test_load_more_replies_uses_recursive_subthread_query(self):
+        url = reverse('comment_replies', kwargs={'comment_id': self.root.pk})
+        with self.assertNumQueries(2):
+            data = self.client.get(url, {'format': 'json', 'offset': 1}).json()
+        self.assertEqual([c['content'] for c in data['comments']], ['second child'])
+
+        data = self.client.get(url, {'format': 'json', 'depth': 2}).json()
+        self.assertEqual(data['comments'][0]['replies'][0]['content'], 'grandchild')
+
+
+class CreateCommentQueryTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(username='writer')
+        category = Category.objects.create(name='General')
+        cls.topic = Topic.objects.create(created_by_id=cls.user, title='t', category=category, content='')
+        cls.parent = Comment.objects.create(user=cls.user, content='parent comment', topic_id=cls.topic)
+
+    def setUp(self):
+        # A real access token: in claims mode authenticating it costs no queries
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {ForumRefreshToken.for_user(self.user).access_token}')
+
+    def test_top_level_comment_is_not_refetched(self):
+        # topic check and insert, plus the search index, user summary, hot score and category counters
+        with self.assertNumQueries(6):
+            response = self.client.post(reverse('create_comment', kwargs={'topic_id': self.topic.pk}),
+                                        {'content': 'hello'})
+        self.assertContains(response, 'writer')
+        self.assertContains(response, 'Лайки: 0')
+
+    def test_reply_honors_parent_id_in_url(self):
+        url = reverse('reply_comment', kwargs={'topic_id': self.topic.pk, 'parent_id': self.parent.pk})
+        # parent lookup, insert, reply_count update, index insert, summary, hot score and category updates,
+        # savepoint pair
+        with self.assertNumQueries(9):
+            response = self.client.post(url, {'content': 'reply'})
+        self.assertContains(response, 'parent comment')
+        reply = Comment.objects.get(content='reply')
+        self.assertEqual(reply.parent, self.parent)
+        self.parent.refresh_from_db()
+        self.assertEqual(self.parent.reply_count, 1)
+
+    def test_missing_topic_or_foreign_parent_is_404(self):
+        other = Topic.objects.create(created_by_id=self.user, title='other', category=self.topic.category, content='')
+        response = self.client.post(reverse('create_comment', kwargs={'topic_id': 0}), {'content': 'x'})
+        self.assertEqual(response.status_code, 404)
+        url = reverse('reply_comment', kwargs={'topic_id': other.pk, 'parent_id': self.parent.pk})
+        self.assertEqual(self.client.post(url, {'content': 'x'}).status_code, 404)
+
+
+class StatelessAuthTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(username='member', email='member@example.com', rating=Decimal('1.25'))
+        cls.user.set_password('secret-password')
+        cls.user.save()
+
+    def obtain(self):
+        response = self.client.post(reverse('token_obtain_pair'),
+                                    {'username': 'member', 'password': 'secret-password'})
+        return response.data
+
+    def test_claims_carry_username_and_rating(self):
+        tokens = self.obtain()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens["access"]}')
+        response = self.client.get(reverse('profile-page'))
+        self.assertEqual((response.data['username'], response.data['rating']), ('member', Decimal('1.25')))
+        self.assertEqual(response.data['email'], 'member@example.com')
+
+        CustomUser.objects.filter(pk=self.user.pk).update(rating=Decimal('2.00'))
+        refreshed = self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']}).data
+        self.assertEqual(AccessToken(refreshed['access'])['rating'], '2.00')
+
+    def test_logout_revokes_the_tokens(self):
+        tokens = self.obtain()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens["access"]}')
+        self.assertEqual(self.client.post(reverse('logout'), {'refresh': tokens['refresh']}).status_code, 200)
+        self.assertEqual(self.client.get(reverse('profile-page')).status_code, 401)
+        self.client.credentials()
+        self.assertEqual(self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']}).status_code, 401)
+
+    def test_refresh_drops_the_staff_claim_after_demotion(self):
+        CustomUser.objects.filter(pk=self.user.pk).update(is_staff=True)
+        tokens = self.obtain()
+        self.assertIs(AccessToken(tokens['access'])['is_staff'], True)
+        CustomUser.objects.filter(pk=self.user.pk).update(is_staff=False)
+        refreshed = self.client.post(reverse('token_refresh'), {'refresh': tokens['refresh']}).data
+        self.assertIs(AccessToken(refreshed['access'])['is_staff'], False)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refreshed["access"]}')
+        self.assertEqual(self.client.get(reverse('response-cache-stats')).status_code, 403)
+
+    def test_password_change_revokes_earlier_tokens(self):
+        access = ForumRefreshToken.for_user(self.user).access_token
+        # Issued a few seconds ago; revocation covers tokens from before the current second
+        access['iat'] -= 5
+        user = CustomUser.objects.get(pk=self.user.pk)
+        user.set_password('new-password')
+        user.save()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access}')
+        self.assertEqual(self.client.get(reverse('profile-page')).status_code, 401)
+        self.assertEqual(self.client.post(reverse('token_obtain_pair'),
+                                          {'username': 'member', 'password': 'new-password'}).status_code, 200)
+
+
+class UserSummaryTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = CustomUser.objects.create(username='prolific')
+        cls.reader = CustomUser.objects.create(username='reader')
+        category = Category.objects.create(name='General')
+        cls.topics = [Topic.objects.create(created_by_id=cls.author, title=f'topic {i}', category=category, content='')
+                      for i in range(25)]
+        cls.comment = Comment.objects.create(user=cls.author, content='first', topic_id=cls.topics[0])
+
+    def summary(self):
+        return UserSummary.objects.get(pk=self.author.pk)
+
+    def test_summary_follows_writes(self):
+        self.client.force_authenticate(self.reader)
+        self.client.post(reverse('like_comment', kwargs={'comment_id': self.comment.pk}))
+        summary = self.summary()
+        self.assertEqual((summary.topic_count, summary.comment_count, summary.likes_received), (25, 1, 1))
+        self.assertEqual(summary.last_activity_at, self.comment.posted_at)
+
+        self.comment.refresh_from_db()
+        self.comment.delete()
+        self.topics[-1].delete()
+        summary = self.summary()
+        self.assertEqual((summary.topic_count, summary.comment_count, summary.likes_received), (24, 0, 0))
+
+        UserSummary.objects.update(topic_count=0)
+        call_command('rebuild_user_summaries', stdout=StringIO())
+        self.assertEqual(self.summary().topic_count, 24)
+
+    def test_profile_pages_topics_in_constant_queries(self):
+        url = reverse('others-profile-page', kwargs={'user_id': self.author.pk})
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertEqual(response.data['topic_count'], 25)
+        self.assertEqual([topic['title'] for topic in response.data['topics']][:2], ['topic 24', 'topic 23'])
+        self.assertEqual(response.data['next_page'], 2)
+
+        response = self.client.get(url, {'page': 2})
+        self.assertEqual(len(response.data['topics']), 5)
+        self.assertIsNone(response.data['next_page'])
+
+
+@override_settings(AVATAR_WORKERS=0)
+class ProfilePictureTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(username='pictured')
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        self.client.force_authenticate(self.user)
+
+    def upload(self, size=(800, 600)):
+        buffer = BytesIO()
+        Image.new('RGB', size, 'teal').save(buffer, 'PNG')
+        picture = SimpleUploadedFile('me.png', buffer.getvalue(), content_type='image/png')
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('profile-picture'), {'profile_picture': picture}, format='multipart')
+
+    def test_upload_produces_variants_and_profile_uses_the_fitting_one(self):
+        self.assertEqual(self.upload().status_code, 202)
+        variants = CustomUser.objects.get(pk=self.user.pk).avatar_variants
+        self.assertEqual(sorted(key for key in variants if key != 'source'), ['128', '256', '64'])
+
+        response = self.client.get(reverse('others-profile-page', kwargs={'user_id': self.user.pk}))
+        name = os.path.basename(variants['128'])
+        self.assertEqual(response.data['profile_picture'], reverse('avatar', kwargs={'name': name}))
+
+        served = self.client.get(reverse('avatar', kwargs={'name': name}))
+        self.assertEqual(served['Cache-Control'], 'public, max-age=31536000, immutable')
+        with Image.open(BytesIO(b''.join(served.streaming_content))) as image:
+            self.assertEqual(image.size, (128, 128))
+
+    def test_small_pictures_are_not_scaled_up(self):
+        self.upload(size=(90, 120))
+        variants = CustomUser.objects.get(pk=self.user.pk).avatar_variants
+        # Identical output is stored once
+        self.assertEqual(variants['128'], variants['256'])
+        self.assertEqual(self.client.get(reverse('avatar', kwargs={'name': 'settings.py'})).status_code, 404)
+
+    @override_settings(AVATAR_MAX_PIXELS=100 * 100)
+    def test_pictures_over_the_pixel_limit_are_rejected_before_decoding(self):
+        self.assertEqual(self.upload(size=(101, 100)).status_code, 400)
+        buffer = BytesIO()
+        Image.new('RGB', (101, 100)).save(buffer, 'PNG')
+        with self.assertRaises(ValueError):
+            render_variants(buffer.getvalue(), [64], 80)
+
+
+class CategoryIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(username='poster')
+        cls.general, cls.empty = Category.objects.create(name='General'), Category.objects.create(name='Empty')
+
+    def index(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('category-list'))
+        return {row['name']: row for row in response.json()}
+
+    def test_counters_follow_topics_and_comments(self):
+        first, last = [Topic.objects.create(created_by_id=self.user, title=title, category=self.general, content='')
+                       for title in ('first', 'last')]
+        comments = [Comment.objects.create(user=self.user, content='hi', topic_id=topic) for topic in (first, first, last)]
+        comments[0].delete()
+
+        index = self.index()
+        general = index['General']
+        self.assertEqual((general['topic_count'], general['comment_count']), (2, 2))
+        self.assertEqual((general['last_topic']['title'], general['last_topic']['created_by_username']),
+                         ('last', 'poster'))
+        self.assertIsNone(index['Empty']['last_topic'])
+
+        last.delete()
+        general = self.index()['General']
+        self.assertEqual((general['topic_count'], general['comment_count'], general['last_topic']['title']),
+                         (1, 1, 'first'))
+        self.assertEqual(Category.objects.get(pk=self.general.pk).last_activity_at, comments[1].posted_at)
+
+    def test_moving_a_topic_recounts_both_categories(self):
+        topic = Topic.objects.create(created_by_id=self.user, title='moved', category=self.general, content='')
+        Comment.objects.create(user=self.user, content='hi', topic_id=topic)
+        old_listing = reverse('topic-list-by-category', kwargs={'category_pk': self.general.pk})
+        self.assertContains(self.client.get(old_listing), 'moved')
+        topic.category = self.empty
+        topic.save()
+
+        self.assertNotContains(self.client.get(old_listing), 'moved')
+
+        index = self.index()
+        self.assertEqual((index['General']['topic_count'], index['General']['comment_count']), (0, 0))
+        self.assertIsNone(index['General']['last_topic'])
+        self.assertEqual((index['Empty']['topic_count'], index['Empty']['comment_count']), (1, 1))
+        self.assertEqual(index['Empty']['last_topic']['title'], 'moved')
+
+    def test_repair_command_fixes_drift(self):
+        Topic.objects.create(created_by_id=self.user, title='topic', category=self.general, content='')
+        Category.objects.filter(pk=self.general.pk).update(topic_count=7, last_topic=None)
+        out = StringIO()
+        call_command('rebuild_category_stats', stdout=out)
+        self.assertIn('Repaired 1 categories', out.getvalue())
+        self.assertEqual(self.index()['General']['topic_count'], 1)
+
+
+class TrendingTopicsTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(username='poster')
+        cls.category = Category.objects.create(name='General')
+        cls.quiet, cls.busy = [Topic.objects.create(created_by_id=cls.user, title=title, category=cls.category,
+                                                    content='') for title in ('quiet', 'busy')]
+
+    def test_activity_moves_topics_up_and_decays(self):
+        comments = [Comment.objects.create(user=self.user, content='hi', topic_id=self.busy) for _ in range(2)]
+        Comment.objects.create(user=self.user, content='hi', topic_id=self.quiet)
+        self.client.force_authenticate(self.user)
+        self.client.post(reverse('like_comments'), {'likes': [
+            {'comment_id': comment.pk, 'liked': True} for comment in comments
+        ]}, format='json')
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('trending-topics'))
+        self.assertEqual([(t['title'], t['hot_score']) for t in response.data], [('busy', 3.0), ('quiet', 1.0)])
+
+        call_command('decay_hot_scores', minutes=24 * 60, stdout=StringIO())
+        self.assertEqual(Topic.objects.get(pk=self.busy.pk).hot_score, 1.5)
+        call_command('decay_hot_scores', recompute=True, stdout=StringIO())
+        self.assertAlmostEqual(Topic.objects.get(pk=self.busy.pk).hot_score, 3.0, places=3)
+
+    def test_removed_activity_never_drives_a_score_negative(self):
+        comment = Comment.objects.create(user=self.user, content='hi', topic_id=self.busy)
+        toggle_like(self.user.pk, comment)
+        call_command('decay_hot_scores', minutes=3 * 24 * 60, stdout=StringIO())
+        toggle_like(self.user.pk, comment)
+        self.assertEqual(Topic.objects.get(pk=self.busy.pk).hot_score, 0)
+
+        Comment.objects.create(user=self.user, content='hi', topic_id=self.quiet).delete()
+        self.assertEqual(Topic.objects.get(pk=self.quiet.pk).hot_score, 0)
+
+        Topic.objects.filter(pk=self.quiet.pk).update(hot_score=-2)
+        call_command('decay_hot_scores', minutes=60, stdout=StringIO())
+        self.assertEqual(Topic.objects.get(pk=self.quiet.pk).hot_score, 0)
+
+
+@override_settings(THROTTLE_BUCKETS={
+    'like': {'user': {'burst': 2, 'per_minute': 60}},
+    'comment': {'ip': {'burst': 1, 'per_minute': 1}},
+})
+class ThrottleTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [CustomUser.objects.create(username=f'user{i}') for i in range(2)]
+        category = Category.objects.create(name='General')
+        cls.topic = Topic.objects.create(created_by_id=cls.users[0], title='t', category=category, content='')
+        cls.comment = Comment.objects.create(user=cls.users[0], content='c', topic_id=cls.topic)
+
+    def setUp(self):
+        get_buckets().reset()
+
+    def test_user_bucket_answers_429_with_retry_after(self):
+        self.client.force_authenticate(self.users[1])
+        url = reverse('like_comment', kwargs={'comment_id': self.comment.pk})
+        self.assertEqual([self.client.post(url).status_code for _ in range(2)], [201, 204])
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(CustomUser.objects.get(pk=self.users[0].pk).rating, 0)
+
+        # Another user has a bucket of their own
+        self.client.force_authenticate(self.users[0])
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertIn('forum_throttle_total{scope="like",kind="user",outcome="throttled"}', metrics_registry.render())
+
+    def test_ip_bucket_is_shared_by_every_user_behind_it(self):
+        url = reverse('create_comment', kwargs={'topic_id': self.topic.pk})
+        self.client.force_authenticate(self.users[0])
+        self.assertEqual(self.client.post(url, {'content': 'first'}).status_code, 200)
+        self.client.force_authenticate(self.users[1])
+        response = self.client.post(url, {'content': 'second'})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '60')
+        self.assertEqual(self.client.post(url, {'content': 'elsewhere'}, REMOTE_ADDR='10.0.0.9').status_code, 200)
+
+    def test_forwarded_for_header_does_not_pick_the_bucket(self):
+        url = reverse('create_comment', kwargs={'topic_id': self.topic.pk})
+        self.client.force_authenticate(self.users[0])
+        statuses = [self.client.post(url, {'content': str(i)}, HTTP_X_FORWARDED_FOR=f'203.0.113.{i}').status_code
+                    for i in range(2)]
+        self.assertEqual(statuses, [200, 429])
+
+    def test_cache_backend_refills_over_time(self):
+        buckets = CacheBuckets()
+        cache.set('kept', True)
+        buckets.reset()
+        self.assertTrue(cache.get('kept'))
+        self.assertEqual(buckets.take('bucket', 1, 0.5), 0)
+        self.assertAlmostEqual(buckets.take('bucket', 1, 0.5), 2, places=1)
+        self.assertEqual(refill(0, 0, 2, capacity=1, rate=0.5, cost=1), (0, 0))
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(username='author')
+        cls.news = Category.objects.create(name='News')
+        cls.other = Category.objects.create(name='Other')
+        cls.topic = Topic.objects.create(created_by_id=cls.user, title='Release notes', category=cls.news,
+                                         content='The new forum engine is here')
+        cls.other_topic = Topic.objects.create(created_by_id=cls.user, title='Gardening', category=cls.other,
+                                               content='Tomatoes need sun')
+        cls.comment = Comment.objects.create(user=cls.user, content='Does the engine support search?',
+                                             topic_id=cls.other_topic)
+
+    def search(self, **params):
+        response = self.client.get(reverse('search'), params)
+        self.assertEqual(response.status_code, 200)
+        return [(r['kind'], r['id']) for r in response.json()['results']]
+
+    def test_ranked_results_filtered_by_category(self):
+        self.assertEqual(set(self.search(q='engine')), {('topic', self.topic.pk), ('comment', self.comment.pk)})
+        self.assertEqual(self.search(q='engine', category=self.news.pk), [('topic', self.topic.pk)])
+        self.assertEqual(self.search(q='releas'), [('topic', self.topic.pk)])
+        self.assertEqual(self.search(q='" OR * NEAR('), [])
+
+    def test_index_follows_writes_and_rebuild(self):
+        self.comment.delete()
+        self.assertEqual(self.search(q='search'), [])
+        self.topic.content = 'Rewritten announcement'
+        self.topic.save()
+        self.assertEqual(self.search(q='announcement'), [('topic', self.topic.pk)])
+
+        call_command('rebuild_search_index', chunk_size=1, stdout=StringIO())
+        self.assertEqual(self.search(q='tomatoes'), [('topic', self.other_topic.pk)])
+
+    def test_pagination_links(self):
+        for i in range(25):
+            Comment.objects.create(user=self.user, content=f'paging example {i}', topic_id=self.topic)
+        data = self.client.get(reverse('search'), {'q': 'paging'}).json()
+        self.assertEqual(len(data['results']), 20)
+        second = self.client.get(data['links']['next']).json()
+        self.assertEqual(len(second['results']), 5)
+        self.assertIsNone(second['links']['next'])
+
+
+class DatabaseProfileTests(TestCase):
+    def test_sqlite_connections_get_configured_pragmas(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS['busy_timeout'])
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+
+class BenchmarkSuiteTests(TestCase):
+    def test_generated_data_is_reproducible_and_consistent(self):
+        summaries = []
+        for prefix in ('first', 'second'):
+            dataset = generate(scale=0.01, seed=7, prefix=prefix, search_index=False)
+            summaries.append(dataset.summary())
+        self.assertEqual(summaries[0], summaries[1])
+        self.assertEqual(Like.objects.count(), 2 * summaries[0]['likes'])
+        self.assertFalse(Comment.objects.exclude(like_count=0).filter(like__isnull=True).exists())
+        self.assertEqual(
+            Comment.objects.filter(parent__isnull=False).count(),
+            sum(Comment.objects.values_list('reply_count', flat=True)),
+        )
+
+    def test_route_scenario_covers_every_route(self):
+        result, = benchmarks.run(['routes'], scale=0.01, requests=1)
+        self.assertEqual(result['uncovered'], [])
+        for name, route in result['routes'].items():
+            self.assertFalse(any(code.startswith('5') for code in route['statuses']), name)
+        self.assertFalse(CustomUser.objects.exists())
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+class QueryPlanTests(TestCase):
+    def test_routes_read_through_indexes(self):
+        result, = benchmarks.run(['query_plans'], scale=0.01)
+        self.assertEqual(result['regressed'], [], json.dumps(result['routes'], indent=2))
+
+    def test_scans_and_sorts_are_reported(self):
+        sql, params = Comment.objects.filter(content='x').order_by('like_count').query.sql_with_params()
+        problems = plan_problems(explain(sql, params), model_tables())
+        self.assertEqual(problems, ['SCAN app_comment', 'USE TEMP B-TREE FOR ORDER BY'])
+
+
+class AsyncReadViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(username='author')
+        cls.news = Category.objects.create(name='News')
+        cls.topics = [Topic.objects.create(created_by_id=cls.user, title=f'topic {i}', category=cls.news,
+                                           content='**body**') for i in range(6)]
+        Comment.objects.create(user=cls.user, content='async comment', topic_id=cls.topics[0])
+
+    async def test_topic_page_combines_topic_comments_and_news(self):
+        with override_settings(NEWS_CATEGORY_ID=self.news.pk):
+            response = await self.async_client.get(reverse('async-topic-page', kwargs={'pk': self.topics[0].pk}))
+        self.assertContains(response, '<strong>body</strong>')
+        self.assertContains(response, 'async comment')
+        self.assertContains(response, 'topic 5')
+        response = await self.async_client.get(reverse('async-topic-detail', kwargs={'pk': 0}))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_category_listing_pages_by_keyset(self):
+        url = reverse('async-topic-list-by-category', kwargs={'category_pk': self.news.pk})
+        first = await self.async_client.get(url)
+        self.assertContains(first, 'topic 5')
+        self.assertNotContains(first, 'topic 1')
+        second = await self.async_client.get(url, {'cursor': encode_cursor(self.topics[2])})
+        self.assertContains(second, 'topic 1')
+        self.assertNotContains(second, 'topic 2')
+
+    async def test_comments_show_likes_to_signed_in_readers_and_cache_for_everyone_else(self):
+        comment = await Comment.objects.aget(topic_id=self.topics[0])
+        await Like.objects.acreate(liked_by_id=self.user, com_id=comment)
+        url = reverse('async-topic-comments', kwargs={'topic_id': self.topics[0].pk})
+        token = await sync_to_async(lambda: str(ForumRefreshToken.for_user(self.user).access_token))()
+
+        response = await self.async_client.get(url, headers={'Authorization': f'Bearer {token}'})
+        self.assertContains(response, 'like-button liked')
+        self.assertNotContains(await self.async_client.get(url), 'like-button liked')
+        before = cache_stats()['AsyncCommentsView']['hits']
+        await self.async_client.get(url)
+        self.assertEqual(cache_stats()['AsyncCommentsView']['hits'], before + 1)
+        response = await self.async_client.get(url, headers={'Authorization': 'Bearer broken'})
+        self.assertEqual(response.status_code, 401)
+
+        await sync_to_async(self.async_client.force_login)(self.user)
+        self.assertContains(await self.async_client.get(url), 'like-button liked')
+        self.assertEqual(cache_stats()['AsyncCommentsView']['hits'], before + 1)
+
+
+class TopicEventTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(username='author')
+        category = Category.objects.create(name='General')
+        cls.topic = Topic.objects.create(created_by_id=cls.user, title='live', category=category, content='')
+        cls.comment = Comment.objects.create(user=cls.user, content='first', topic_id=cls.topic)
+
+    def setUp(self):
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def post(self, url, data=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.api.post(url, data)
+
+    async def test_writes_are_pushed_to_topic_stream(self):
+        stream = topic_event_stream(self.topic.pk, heartbeat=1)
+        self.assertEqual(await anext(stream), 'retry: 3000\n\n')
+        pending = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+
+        await sync_to_async(self.post)(reverse('like_comment', kwargs={'comment_id': self.comment.pk}))
+        frame = await asyncio.wait_for(pending, 1)
+        self.assertTrue(frame.startswith('event: like.toggled\n'))
+        self.assertEqual(json.loads(frame.split('data: ')[1]),
+                         {'type': 'like.toggled', 'comment_id': self.comment.pk, 'delta': 1})
+
+        await sync_to_async(self.post)(reverse('create_comment', kwargs={'topic_id': self.topic.pk}), {'content': 'hi'})
+        frame = await asyncio.wait_for(anext(stream), 1)
+        self.assertIn('"content": "hi"', frame)
+        self.assertEqual(await anext(stream), ': ping\n\n')
+        await stream.aclose()
+        self.assertFalse(get_broker().subscriptions)
+
+
+class ImportExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = CustomUser.objects.create(username='author', rating=Decimal('1.50'))
+        cls.fan = CustomUser.objects.create(username='fan')
+        category = Category.objects.create(name='General')
+        topic = Topic.objects.create(created_by_id=cls.user, title='exported', category=category, content='*hi*')
+        root = Comment.objects.create(user=cls.user, content='root', topic_id=topic, reply_count=1, like_count=1)
+        Comment.objects.create(user=cls.fan, content='reply', parent=root, topic_id=topic)
+        Like.objects.create(liked_by_id=cls.fan, com_id=root)
+
+    def test_round_trip_remaps_ids_and_resumes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            dump = os.path.join(tmp, 'forum.ndjson.gz')
+            call_command('export_forum', dump, chunk_size=1, stderr=StringIO())
+            posted_at = Topic.objects.get().created_at
+            Category.objects.all().delete()
+            CustomUser.objects.filter(username='fan').delete()
+
+            call_command('import_forum', dump, batch_size=1, stderr=StringIO())
+            call_command('import_forum', dump, batch_size=1, stderr=StringIO())  # already complete: a no-op
+
+        topic = Topic.objects.get()
+        self.assertEqual(topic.created_at, posted_at)
+        self.assertEqual(topic.content_html, '<p><em>hi</em></p>')
+        self.assertEqual(topic.created_by_id, self.user)
+        reply = Comment.objects.get(content='reply')
+        self.assertEqual(reply.parent.content, 'root')
+        self.assertEqual(reply.user.username, 'fan')
+        like = Like.objects.get()
+        self.assertEqual((like.liked_by_id.username, like.com_id.content), ('fan', 'root'))
+        self.assertEqual(CustomUser.objects.get(username='fan').rating, Decimal('0'))
+        self.assertEqual(get_search_backend().search('reply')[0]['id'], reply.pk)
+
+    def test_content_html_from_the_dump_is_rebuilt(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            dump = os.path.join(tmp, 'forum.ndjson')
+            call_command('export_forum', dump, stderr=StringIO())
+            with open(dump) as f:
+                records = [json.loads(line) for line in f]
+            for record in records:
+                if record['model'] == 'topic':
+                    record['content_html'] = '<img src=x onerror=alert(1)><script>alert(2)</script>'
+            with open(dump, 'w') as f:
+                f.writelines(json.dumps(record) + '\n' for record in records)
+            Category.objects.all().delete()
+            call_command('import_forum', dump, stderr=StringIO())
+
+        self.assertEqual(Topic.objects.get().content_html, '<p><em>hi</em></p>')
+
+    def test_resume_after_a_crash_between_the_two_commits(self):
+        commit_staged = ImportState.commit_staged
+        calls = []
+
+        def crash_on_the_first_comment(state):
+            calls.append(state.staged()[0])
+            if calls.count('comment') == 1:
+                raise RuntimeError('killed')
+            commit_staged(state)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            dump = os.path.join(tmp, 'forum.ndjson')
+            call_command('export_forum', dump, stderr=StringIO())
+            Category.objects.all().delete()
+            ImportState.commit_staged = crash_on_the_first_comment
+            try:
+                with self.assertRaises(RuntimeError):
+                    call_command('import_forum', dump, batch_size=1, stderr=StringIO())
+            finally:
+                ImportState.commit_staged = commit_staged
+            err = StringIO()
+            call_command('import_forum', dump, batch_size=1, stderr=err)
+
+        self.assertIn('Recovered a comment batch', err.getvalue())
+        self.assertEqual((Topic.objects.count(), Comment.objects.count(), Like.objects.count()), (1, 2, 1))
+        self.assertEqual(Comment.objects.get(content='reply').parent.content, 'root')
+
+
+@override_settings(RESPONSE_CACHE_TIMEOUT=0)
+class RequestMetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = CustomUser.objects.create(username='author')
+        category = Category.objects.create(name='General')
+        Topic.objects.create(created_by_id=author, title='measured', category=category, content='')
+
+    def test_requests_are_recorded_per_route(self):
+        before = metrics_registry.histogram('db_queries', 'topic-list').snapshot()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('topic-list'))
+        counts, total = metrics_registry.histogram('db_queries', 'topic-list').snapshot()
+        self.assertEqual(sum(counts) - sum(before[0]), 1)
+        self.assertEqual(total - before[1], len(queries))
+        self.assertGreater(metrics_registry.histogram('serializer_duration_seconds', 'topic-list').snapshot()[1], 0)
+        self.assertGreater(metrics_registry.histogram('render_duration_seconds', 'topic-list').snapshot()[1], 0)
+
+        with self.settings(METRICS_TOKEN='scrape'):
+            body = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape').content.decode()
+        self.assertIn('# TYPE forum_request_duration_seconds histogram', body)
+        self.assertIn('forum_db_queries_bucket{route="topic-list",le="+Inf"}', body)
+
+    @override_settings(METRICS_TOKEN='scrape')
+    def test_metrics_endpoint_requires_the_token(self):
+        self.assertEqual(self.client.get(reverse('metrics'), REMOTE_ADDR='127.0.0.1').status_code, 403)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, 403)
+
+    @override_settings(METRICS_SLOW_REQUEST_MS=0)
+    def test_slow_requests_are_logged_with_their_sql(self):
+        with self.assertLogs('app.metrics', 'WARNING') as logs:
+            self.client.get(reverse('topic-list'))
+        self.assertIn('app_topic', logs.output[0])
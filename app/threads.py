@@ -0,0 +1,57 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models.expressions import RawSQL
+
+from .models import Comment
+
+SUBTREE_SQL = '''
+    WITH RECURSIVE subtree(id, depth) AS (
+        SELECT id, 1 FROM {table} WHERE parent_id = %s
+        UNION ALL
+        SELECT c.id, s.depth + 1 FROM {table} c JOIN subtree s ON c.parent_id = s.id WHERE s.depth < %s
+    )
+    SELECT id FROM subtree
+'''
+
+
+def clamp(value, default, upper=None):
+    try:
+        value = max(0, int(value))
+    except (TypeError, ValueError):
+        return default
+    return value if upper is None else min(value, upper)
+
+
+def topic_comments(topic_id):
+    return Comment.objects.select_related('user').filter(topic_id=topic_id).order_by('posted_at', 'id')
+
+
+def subthread_comments(root_id, max_depth):
+    sql = SUBTREE_SQL.format(table=Comment._meta.db_table)
+    return (Comment.objects.select_related('user')
+            .filter(pk__in=RawSQL(sql, (root_id, max_depth)))
+            .order_by('posted_at', 'id'))
+
+
+def build_tree(comments, root_id=None, max_depth=None, max_replies=None, offset=0):
+    # comments must be ordered by posted_at; every node gets depth, thread_replies and hidden_replies
+    max_depth = settings.COMMENT_TREE_MAX_DEPTH if max_depth is None else max_depth
+    max_replies = settings.COMMENT_TREE_REPLIES if max_replies is None else max_replies
+
+    children = defaultdict(list)
+    for comment in comments:
+        children[comment.parent_id].append(comment)
+
+    top_level = children[root_id]
+    roots = top_level[offset:offset + max_replies]
+    stack = [(comment, 1) for comment in roots]
+    while stack:
+        comment, depth = stack.pop()
+        replies = children[comment.pk] if depth < max_depth else []
+        comment.depth = depth
+        comment.thread_replies = replies[:max_replies]
+        # reply_count also covers replies that the depth limit kept out of the query
+        comment.hidden_replies = max(0, comment.reply_count - len(comment.thread_replies))
+        stack.extend((reply, depth + 1) for reply in comment.thread_replies)
+    return roots, max(0, len(top_level) - offset - len(roots))
@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.throttling import BaseThrottle
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def record(scope, kind, outcome):
+    with _stats_lock:
+        _stats[scope, kind, outcome] += 1
+
+
+def throttle_stats():
+    with _stats_lock:
+        return dict(_stats)
+
+
+def refill(tokens, updated, now, capacity, rate, cost):
+    # Returns the bucket after this request and how long to wait if it can't be served yet
+    tokens = min(capacity, tokens + (now - updated) * rate)
+    if tokens >= cost:
+        return tokens - cost, 0
+    return tokens, (cost - tokens) / rate
+
+
+# Buckets for a single process; the oldest ones are dropped once there are max_buckets
+class MemoryBuckets:
+    def __init__(self):
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def take(self, key, capacity, rate, cost=1):
+        now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.pop(key, (capacity, now))
+            tokens, wait = refill(tokens, updated, now, capacity, rate, cost)
+            self.buckets[key] = (tokens, now)
+            if len(self.buckets) > settings.THROTTLE_MEMORY_BUCKETS:
+                self.buckets.pop(next(iter(self.buckets)))
+        return wait
+
+    def reset(self):
+        with self.lock:
+            self.buckets.clear()
+
+
+# Buckets shared by every process through a cache (Redis, memcached). The read and write aren't
+# atomic, so concurrent requests can slip a few extra tokens through; a full bucket is simply
+# left to expire.
+class CacheBuckets:
+    def cache(self):
+        return caches[settings.THROTTLE_CACHE_ALIAS]
+
+    def take(self, key, capacity, rate, cost=1):
+        now = time.time()
+        cache = self.cache()
+        tokens, updated = cache.get(key) or (capacity, now)
+        tokens, wait = refill(tokens, updated, now, capacity, rate, cost)
+        cache.set(key, (tokens, now), int((capacity - tokens) / rate) + 1)
+        return wait
+
+    def reset(self):
+        # Clears the whole alias, which is why THROTTLE_CACHE_ALIAS is not shared with anything else
+        self.cache().clear()
+
+
+@lru_cache(maxsize=None)
+def get_buckets():
+    return import_string(settings.THROTTLE_BACKEND)()
+
+
+# Token bucket per view throttle_scope, configured in THROTTLE_BUCKETS[scope][kind] as a burst
+# and a refill rate per minute. DRF answers a denied request with 429 and Retry-After.
+class TokenBucketThrottle(BaseThrottle):
+    kind = None
+
+    def get_bucket_ident(self, request):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        scope = getattr(view, 'throttle_scope', None)
+        limits = settings.THROTTLE_BUCKETS.get(scope, {}).get(self.kind)
+        ident = self.get_bucket_ident(request)
+        if not limits or ident is None:
+            return True
+        self.delay = get_buckets().take(f'throttle:{scope}:{self.kind}:{ident}', limits['burst'],
+                                        limits['per_minute'] / 60)
+        record(scope, self.kind, 'throttled' if self.delay else 'allowed')
+        return not self.delay
+
+    def wait(self):
+        return self.delay
+
+
+class UserBucketThrottle(TokenBucketThrottle):
+    kind = 'user'
+
+    def get_bucket_ident(self, request):
+        return request.user.pk if request.user.is_authenticated else None
+
+
+class IPBucketThrottle(TokenBucketThrottle):
+    kind = 'ip'
+
+    def get_bucket_ident(self, request):
+        return self.get_ident(request)
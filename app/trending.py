@@ -0,0 +1,71 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .models import Comment, Topic
+
+# Activity older than this many half-lives adds less than 0.1% of its weight and is left out of recomputes
+HORIZON_HALF_LIVES = 10
+
+
+def half_life_seconds():
+    return settings.HOT_SCORE_HALF_LIFE_HOURS * 3600
+
+
+def hot_score(activity, now, half_life, comment_weight, like_weight):
+    # activity is (posted_at, like_count) per comment; likes carry no timestamp of their own,
+    # so they decay with the comment they were given to
+    return sum(
+        (comment_weight + like_weight * likes) * 0.5 ** ((now - posted_at).total_seconds() / half_life)
+        for posted_at, likes in activity
+    )
+
+
+def record_activity(topic_id, weight):
+    # Scores are decayed in bulk by decay_hot_scores, so fresh activity simply adds its full weight.
+    # Removed activity takes off its full weight too, which can overshoot what is left after decay.
+    Topic.objects.filter(pk=topic_id).update(hot_score=Greatest(F('hot_score') + weight, 0.0))
+
+
+def topic_batches(queryset, batch_size):
+    last_pk = 0
+    while True:
+        pks = list(queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return
+        yield pks
+        last_pk = pks[-1]
+
+
+def decay(elapsed, batch_size=1000):
+    factor = 0.5 ** (elapsed.total_seconds() / half_life_seconds())
+    floor = settings.HOT_SCORE_FLOOR
+    updated = 0
+    # Negative scores predate the clamp in record_activity and are zeroed along with the ones under the floor
+    for pks in topic_batches(Topic.objects.exclude(hot_score=0), batch_size):
+        Topic.objects.filter(pk__in=pks, hot_score__lt=floor / factor).update(hot_score=0)
+        updated += Topic.objects.filter(pk__in=pks, hot_score__gt=0).update(hot_score=F('hot_score') * factor)
+    return updated
+
+
+def recompute(batch_size=1000, now=None):
+    now = now or timezone.now()
+    half_life = half_life_seconds()
+    since = now - timedelta(seconds=half_life * HORIZON_HALF_LIVES)
+    updated = 0
+    for pks in topic_batches(Topic.objects.all(), batch_size):
+        activity = defaultdict(list)
+        rows = Comment.objects.filter(topic_id__in=pks, posted_at__gte=since)
+        for topic_id, posted_at, likes in rows.values_list('topic_id', 'posted_at', 'like_count'):
+            activity[topic_id].append((posted_at, likes))
+        topics = [
+            Topic(pk=pk, hot_score=hot_score(activity[pk], now, half_life, settings.HOT_SCORE_COMMENT_WEIGHT,
+                                             settings.HOT_SCORE_LIKE_WEIGHT))
+            for pk in pks
+        ]
+        updated += Topic.objects.bulk_update(topics, ['hot_score'])
+    return updated
@@ -1,23 +1,42 @@
-from decimal import Decimal
-import markdown
+import hmac
 
+from django.conf import settings
 from django.contrib.auth import get_user_model, authenticate, login, logout
-from django.http import HttpResponseRedirect
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseRedirect
 from django.shortcuts import render
-from django.template.loader import render_to_string
 from rest_framework import generics, status, permissions
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.parsers import MultiPartParser
 from rest_framework.generics import ListAPIView, RetrieveAPIView, get_object_or_404, CreateAPIView
-from rest_framework.pagination import PageNumberPagination
-from rest_framework.permissions import IsAuthenticated, AllowAny
-from rest_framework.renderers import TemplateHTMLRenderer
+from rest_framework.pagination import PageNumberPagination, CursorPagination
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
+from rest_framework.renderers import TemplateHTMLRenderer, JSONRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+from rest_framework_simplejwt.exceptions import TokenError
 from rest_framework_simplejwt.tokens import RefreshToken
 
 
-from .serializers import UserSerializer, TopicSerializer, CommentSerializer
+from .auth import ForumRefreshToken, model_user, revoke_token
+from .avatars import VARIANT_NAME, avatar_url
+from .cache import CachedResponseMixin, cache_stats
+from .likes import UnknownComments, liked_comment_ids, set_likes, toggle_like
+from .metrics import registry as metrics_registry
+from .events import publish_topic_event
+from .fragments import render_comment, render_thread
+from .serializers import UserSerializer, TopicSerializer, TopicSummarySerializer, CommentSerializer
+from .serializers import CommentTreeSerializer, LikeBatchSerializer, ProfilePictureSerializer, TrendingTopicSerializer
+from .serializers import CategorySerializer
+from .search import get_backend as get_search_backend
+from .threads import build_tree, clamp, subthread_comments, topic_comments
+from .throttles import IPBucketThrottle, UserBucketThrottle
 
-from .models import Topic, Category, CustomUser, Comment, Like
+from .models import Topic, Category, CustomUser, Comment, UserSummary
 
 
 class UserRegistrationView(generics.CreateAPIView):
@@ -29,7 +48,7 @@ class UserRegistrationView(generics.CreateAPIView):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         user = self.perform_create(serializer)
-        refresh = RefreshToken.for_user(user)
+        refresh = ForumRefreshToken.for_user(user)
         access_token = str(refresh.access_token)
 
         return Response({
@@ -45,38 +64,85 @@ class UserInfoView(APIView):
     renderer_classes = [TemplateHTMLRenderer]
     template_name = 'user_profile.html'
     permission_classes = [AllowAny]
+    topics_per_page = 20
 
     def get(self, request, user_id=None):
-        if user_id is None:
-            if request.user.is_authenticated:
-                user = request.user
-                topics = Topic.objects.filter(created_by_id=user.id).values('id', 'title', 'created_at')
-                data = {
-                    'username': user.username,
-                    'rating': user.rating,
-                    'profile_picture': user.profile_picture.url if user.profile_picture else None,
-                    'email': user.email,
-                    'topics': topics
-                }
-            else:
+        own_profile = user_id is None
+        if own_profile:
+            if not request.user.is_authenticated:
                 data = {'detail': 'User not found or not provided'}
                 return Response(data, status=status.HTTP_404_NOT_FOUND)
-        else:
-            user = get_object_or_404(CustomUser, pk=user_id)
-            topics = Topic.objects.filter(created_by_id=user_id).values('id','title', 'created_at')
-            data = {
-                'username': user.username,
-                'rating': user.rating,
-                'profile_picture': user.profile_picture.url if user.profile_picture else None,
-                'topics': topics
-            }
+            user_id = request.user.id
+
+        user = get_object_or_404(CustomUser.objects.select_related('summary'), pk=user_id)
+        summary = getattr(user, 'summary', None) or UserSummary(user=user)
 
+        # The summary already knows how many topics there are, so paging needs no COUNT
+        page = clamp(request.query_params.get('page'), 1) or 1
+        offset = (page - 1) * self.topics_per_page
+        topics = []
+        if offset < summary.topic_count:
+            topics = (Topic.objects.filter(created_by_id=user.pk).order_by('-created_at', '-id')
+                      .values('id', 'title', 'created_at')[offset:offset + self.topics_per_page])
+
+        data = {
+            'username': user.username,
+            'rating': user.rating,
+            # Shown 100px tall, so the smallest variant covering that, and twice that for dense screens
+            'profile_picture': avatar_url(user, 100),
+            'profile_picture_2x': avatar_url(user, 200),
+            'topics': topics,
+            'topic_count': summary.topic_count,
+            'comment_count': summary.comment_count,
+            'likes_received': summary.likes_received,
+            'last_activity_at': summary.last_activity_at,
+            'page': page,
+            'previous_page': page - 1 if page > 1 else None,
+            'next_page': page + 1 if offset + self.topics_per_page < summary.topic_count else None,
+        }
+        if own_profile:
+            data['email'] = user.email
         return Response(data)
 
 
+class ProfilePictureView(APIView):
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        user = CustomUser.objects.get(pk=request.user.id)
+        serializer = ProfilePictureSerializer(user, data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # Saving schedules the thumbnails; the profile shows the original until they are ready
+        serializer.save()
+        return Response({'status': 'processing'}, status=status.HTTP_202_ACCEPTED)
+
+
+class AvatarView(APIView):
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    def get(self, request, name):
+        path = f'{settings.AVATAR_DIR}/{name}'
+        if not VARIANT_NAME.match(name) or not default_storage.exists(path):
+            raise Http404
+        response = FileResponse(default_storage.open(path), content_type='image/webp')
+        # Names are content hashes, so a URL always means the same bytes
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+        return response
+
+
 class LogoutView(APIView):
 
     def post(self, request):
+        if request.auth is not None:
+            revoke_token(request.auth)
+        refresh = request.data.get('refresh')
+        if refresh:
+            try:
+                revoke_token(RefreshToken(refresh))
+            except TokenError:
+                pass
         logout(request)
         return Response({"message": "logged out"}, status=status.HTTP_200_OK)
 
@@ -89,18 +155,17 @@ class TopicCreateView(generics.CreateAPIView):
     template_name = 'topic.html'
 
     def perform_create(self, serializer):
-        serializer.save(created_by_id=self.request.user)
+        serializer.save(created_by_id=model_user(self.request.user))
 
     def create(self, request, *args, **kwargs):
         response = super(TopicCreateView, self).create(request, *args, **kwargs)
         if response.status_code == 201:
             topic = response.data
-            category = Category.objects.get(pk=topic['category'])
-            html_content = markdown.markdown(topic['content'])
             context = {
                 'title': topic['title'],
-                'content': html_content,
-                'category_name': category.name,
+                'content_html': topic['content_html'],
+                'category_name': topic['category_name'],
+                'created_by_id': topic['created_by_id'],
                 'created_by_username': request.user.username,
                 'formatted_created_at': topic['formatted_created_at']
             }
@@ -108,13 +173,16 @@ class TopicCreateView(generics.CreateAPIView):
         return response
 
 
-class TopicDetailView(RetrieveAPIView):
-    queryset = Topic.objects.all()
+class TopicDetailView(CachedResponseMixin, RetrieveAPIView):
+    queryset = Topic.objects.for_detail()
     serializer_class = TopicSerializer
     renderer_classes = [TemplateHTMLRenderer]
     permission_classes = [AllowAny]
     template_name = 'topic.html'
 
+    def get_cache_scopes(self):
+        return ['categories', f'topic:{self.kwargs["pk"]}']
+
 
 class TopicPagination(PageNumberPagination):
     page_size = 4
@@ -130,22 +198,66 @@ class TopicPagination(PageNumberPagination):
         })
 
 
-class TopicListView(ListAPIView):
-    serializer_class = TopicSerializer
+def count_topics(queryset, category_pk):
+    mode = settings.TOPIC_COUNT_MODE
+    if mode == 'exact':
+        return queryset.count()
+    if mode == 'counter':
+        if category_pk is None:
+            return queryset.count()
+        return Category.objects.filter(pk=category_pk).values_list('topic_count', flat=True).first() or 0
+    if mode == 'cached':
+        key = f'topic-count:{category_pk}'
+        count = cache.get(key)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, settings.TOPIC_COUNT_CACHE_TIMEOUT)
+        return count
+    return None
+
+
+class TopicCursorPagination(CursorPagination):
+    page_size = 4
+    ordering = ('-created_at', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count = count_topics(queryset, view.kwargs.get('category_pk') if view else None)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        return Response({
+            'links': {
+                'next': self.get_next_link(),
+                'previous': self.get_previous_link()
+            },
+            'count': self.count,
+            'topics': data
+        })
+
+
+class TopicListView(CachedResponseMixin, ListAPIView):
+    serializer_class = TopicSummarySerializer
     renderer_classes = [TemplateHTMLRenderer]
     template_name = 'topic_list.html'
     permission_classes = [AllowAny]
-    pagination_class = TopicPagination
+
+    @property
+    def pagination_class(self):
+        if settings.TOPIC_PAGINATION_MODE == 'cursor':
+            return TopicCursorPagination
+        return TopicPagination
+
+    def get_cache_scopes(self):
+        category_pk = self.kwargs.get('category_pk')
+        if category_pk is None:
+            return ['categories', 'topics']
+        return ['categories', f'category:{category_pk}']
 
     def get_queryset(self):
         category_pk = self.kwargs.get('category_pk')
         if category_pk is None:
-            queryset = Topic.objects.all().order_by('-created_at')[:4]
-            print("Last topics queryset:", queryset)  # Добавить для отладки
-        else:
-            queryset = Topic.objects.filter(category_id=category_pk).order_by('-created_at')
-            print("Category queryset:", queryset)  # Добавить для отладки
-        return queryset
+            return Topic.objects.for_listing().order_by('-created_at')[:4]
+        return Topic.objects.for_listing().filter(category_id=category_pk).order_by('-created_at')
 
     def list(self, request, *args, **kwargs):
         queryset = self.get_queryset()
@@ -165,13 +277,16 @@ class TopicListView(ListAPIView):
         return Response({'topics': serializer.data})
 
 
-class LatestNewsView(ListAPIView):
-    serializer_class = TopicSerializer
+class LatestNewsView(CachedResponseMixin, ListAPIView):
+    serializer_class = TopicSummarySerializer
     renderer_classes = [TemplateHTMLRenderer]
     template_name = 'latest_news.html'
 
+    def get_cache_scopes(self):
+        return [f'category:{settings.NEWS_CATEGORY_ID}']
+
     def get_queryset(self):
-        return Topic.objects.filter(category__pk=1).order_by('-created_at')[:2]
+        return Topic.objects.for_listing().filter(category_id=settings.NEWS_CATEGORY_ID).order_by('-created_at')[:2]
 
     def get(self, request, *args, **kwargs):
         response = super().get(request, *args, **kwargs)
@@ -181,53 +296,204 @@ class LatestNewsView(ListAPIView):
         return Response(data, template_name=self.template_name)
 
 
+class CategoryListView(CachedResponseMixin, ListAPIView):
+    serializer_class = CategorySerializer
+    permission_classes = [AllowAny]
+
+    def get_cache_scopes(self):
+        return ['category-index']
+
+    def get_queryset(self):
+        # Counters and the last topic are stored on the category, so this is one query at any size
+        return Category.objects.select_related('last_topic__created_by_id').only(
+            'name', 'topic_count', 'comment_count', 'last_activity_at',
+            'last_topic__title', 'last_topic__created_at', 'last_topic__created_by_id__username',
+        ).order_by('name', 'pk')
+
+
+class TrendingTopicsView(ListAPIView):
+    serializer_class = TrendingTopicSerializer
+    permission_classes = [AllowAny]
+    page_size = 20
+    max_page_size = 100
+
+    def get_queryset(self):
+        # Served straight off the hot_score indexes; nothing is aggregated per request
+        topics = Topic.objects.trending()
+        if 'category_pk' in self.kwargs:
+            topics = topics.filter(category_id=self.kwargs['category_pk'])
+        limit = clamp(self.request.query_params.get('limit'), self.page_size, self.max_page_size)
+        return topics[:limit]
+
+
 class CreateCommentView(CreateAPIView):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
     permission_classes = [IsAuthenticated]
+    throttle_classes = [UserBucketThrottle, IPBucketThrottle]
+    throttle_scope = 'comment'
 
     def perform_create(self, serializer):
-        topic_id = self.kwargs.get('topic_id')
-        topic = get_object_or_404(Topic, pk=topic_id)
-        serializer.save(user=self.request.user, topic_id=topic)
+        topic_id = self.kwargs['topic_id']
+        parent_id = self.kwargs.get('parent_id', self.request.data.get('parent'))
+        if not parent_id:
+            get_object_or_404(Topic.objects.only('id'), pk=topic_id)
+            comment = serializer.save(user=model_user(self.request.user), topic_id_id=topic_id)
+        else:
+            # A parent in the same topic proves the topic exists, so one lookup covers both
+            parent = get_object_or_404(
+                Comment.objects.select_related('user').only('id', 'content', 'user__username'),
+                pk=parent_id, topic_id=topic_id,
+            )
+            with transaction.atomic():
+                comment = serializer.save(user=model_user(self.request.user), topic_id_id=topic_id, parent=parent)
+                # version stays: reply_count is not part of the rendered fragment
+                Comment.objects.filter(pk=parent.pk).update(reply_count=F('reply_count') + 1)
+
+        publish_topic_event(topic_id, {
+            'type': 'comment.created',
+            'id': comment.pk,
+            'parent_id': comment.parent_id,
+            'user_username': comment.user.username,
+            'content': comment.content,
+            'posted_at': comment.posted_at.isoformat(),
+        })
+        return comment
 
     def create(self, request, *args, **kwargs):
-        response = super().create(request, *args, **kwargs)
-        if response.status_code == 201:
-            comment = Comment.objects.get(pk=response.data['id'])
-            html = render_to_string('comment_partial.html', {'comment': comment})
-            return Response(html, content_type='text/html')
-        else:
-            return response
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        comment = self.perform_create(serializer)
+        return Response(render_comment(comment), content_type='text/html')
 
 
-class CommentsView(APIView):
+class CommentsView(CachedResponseMixin, APIView):
     renderer_classes = [TemplateHTMLRenderer]
-    template_name = 'comments.html'
     permission_classes = [AllowAny]
 
+    def get_cache_scopes(self):
+        return [f'comments:{self.kwargs["topic_id"]}']
+
+    def should_cache(self, request):
+        # Signed-in readers see their own likes; JWT users are only known once DRF authenticates them
+        return not request.user.is_authenticated and 'HTTP_AUTHORIZATION' not in request.META
+
     def get(self, request, *args, **kwargs):
         topic_id = self.kwargs.get('topic_id')
-        comments = Comment.objects.filter(topic_id=topic_id).order_by('posted_at')
-        return Response({'comments': comments})
+        comments = Comment.objects.with_thread_data().filter(topic_id=topic_id).order_by('posted_at')
+        return HttpResponse(render_thread(comments, liked_comment_ids(request.user, topic_id)))
+
+
+class CommentTreeView(APIView):
+    renderer_classes = [TemplateHTMLRenderer, JSONRenderer]
+    template_name = 'comment_tree.html'
+    permission_classes = [AllowAny]
+
+    def get_tree_options(self):
+        params = self.request.query_params
+        return {
+            'max_depth': clamp(params.get('depth'), settings.COMMENT_TREE_MAX_DEPTH, settings.COMMENT_TREE_MAX_DEPTH),
+            'max_replies': clamp(params.get('replies'), settings.COMMENT_TREE_REPLIES, settings.COMMENT_TREE_REPLIES),
+            'offset': clamp(params.get('offset'), 0),
+        }
+
+    def get(self, request, topic_id):
+        roots, remaining = build_tree(topic_comments(topic_id), **self.get_tree_options())
+        context = {'liked_comment_ids': liked_comment_ids(request.user, topic_id)}
+        return Response({
+            'topic_id': topic_id,
+            'parent_id': None,
+            'comments': CommentTreeSerializer(roots, many=True, context=context).data,
+            'remaining': remaining,
+        })
+
+
+class CommentRepliesView(CommentTreeView):
+
+    def get(self, request, comment_id):
+        root = get_object_or_404(Comment.objects.only('id', 'topic_id'), pk=comment_id)
+        options = self.get_tree_options()
+        comments = subthread_comments(root.pk, options['max_depth'])
+        replies, remaining = build_tree(comments, root_id=root.pk, **options)
+        context = {'liked_comment_ids': liked_comment_ids(request.user, root.topic_id_id)}
+        return Response({
+            'topic_id': root.topic_id_id,
+            'parent_id': root.pk,
+            'comments': CommentTreeSerializer(replies, many=True, context=context).data,
+            'remaining': remaining,
+        })
 
 
 class LikeCommentView(APIView):
     permission_classes = [IsAuthenticated]
+    throttle_classes = [UserBucketThrottle, IPBucketThrottle]
+    throttle_scope = 'like'
 
     def post(self, request, comment_id):
-        comment = get_object_or_404(Comment, pk=comment_id)
-        like, created = Like.objects.get_or_create(com_id=comment, liked_by_id=request.user)
-        author = comment.user
-
-        if created:
-            author.rating += Decimal('0.05')
-            author.save(update_fields=['rating'])
-            print(f"Рейтинг пользователя {author.username} после лайка: {author.rating}")
+        comment = get_object_or_404(Comment.objects.only('id', 'user_id', 'topic_id'), pk=comment_id)
+        if toggle_like(request.user.id, comment):
             return Response({'status': 'like added'}, status=status.HTTP_201_CREATED)
-        else:
-            like.delete()
-            author.rating -= Decimal('0.05')
-            author.save(update_fields=['rating'])
-            print(f"Рейтинг пользователя {author.username} после лайка: {author.rating}")
-            return Response({'status': 'like removed'}, status=status.HTTP_204_NO_CONTENT)
+        return Response({'status': 'like removed'}, status=status.HTTP_204_NO_CONTENT)
+
+
+class LikeBatchView(APIView):
+    permission_classes = [IsAuthenticated]
+    throttle_classes = [UserBucketThrottle, IPBucketThrottle]
+    throttle_scope = 'like'
+
+    def post(self, request):
+        serializer = LikeBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        # A comment listed twice takes its last state
+        states = {item['comment_id']: item['liked'] for item in serializer.validated_data['likes']}
+        try:
+            results = set_likes(request.user.id, states)
+        except UnknownComments as exc:
+            return Response({'detail': str(exc), 'comment_ids': exc.comment_ids}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'results': results})
+
+
+class SearchView(APIView):
+    permission_classes = [AllowAny]
+    page_size = 20
+
+    def page_link(self, page):
+        url = self.request.build_absolute_uri()
+        if page == 1:
+            return remove_query_param(url, 'page')
+        return replace_query_param(url, 'page', page)
+
+    def get(self, request):
+        text = request.query_params.get('q', '').strip()
+        category_id = clamp(request.query_params.get('category'), None)
+        page = clamp(request.query_params.get('page'), 1) or 1
+        results = get_search_backend().search(
+            text, category_id=category_id, limit=self.page_size + 1, offset=(page - 1) * self.page_size,
+        )
+        return Response({
+            'links': {
+                'next': self.page_link(page + 1) if len(results) > self.page_size else None,
+                'previous': self.page_link(page - 1) if page > 1 else None,
+            },
+            'query': text,
+            'results': results[:self.page_size],
+        })
+
+
+class ResponseCacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(cache_stats())
+
+
+class MetricsView(APIView):
+    permission_classes = [AllowAny]
+    authentication_classes = []
+
+    def get(self, request):
+        token = settings.METRICS_TOKEN
+        supplied = request.META.get('HTTP_AUTHORIZATION', '').removeprefix('Bearer ')
+        if not token or not hmac.compare_digest(supplied.encode(), token.encode()):
+            raise PermissionDenied()
+        return HttpResponse(metrics_registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
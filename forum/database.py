@@ -0,0 +1,62 @@
+"""
+Database profiles for the forum project.
+
+FORUM_DB_ENGINE selects 'sqlite' (default) or 'postgres'; the remaining
+FORUM_DB_* variables fill in connection details.
+"""
+
+import os
+
+
+def env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def sqlite_config(base_dir):
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('FORUM_DB_NAME', base_dir / 'db.sqlite3'),
+        'CONN_MAX_AGE': env_int('FORUM_DB_CONN_MAX_AGE', 60),
+        'OPTIONS': {
+            # Seconds the driver waits on a locked database before raising
+            'timeout': env_int('FORUM_DB_BUSY_TIMEOUT_MS', 5000) / 1000,
+        },
+    }
+
+
+def postgres_config():
+    return {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('FORUM_DB_NAME', 'forum'),
+        'USER': os.environ.get('FORUM_DB_USER', 'forum'),
+        'PASSWORD': os.environ.get('FORUM_DB_PASSWORD', ''),
+        'HOST': os.environ.get('FORUM_DB_HOST', 'localhost'),
+        'PORT': os.environ.get('FORUM_DB_PORT', '5432'),
+        # Persistent connections; with FORUM_DB_POOLER=pgbouncer they are pooled in transaction mode
+        'CONN_MAX_AGE': env_int('FORUM_DB_CONN_MAX_AGE', 300),
+        'CONN_HEALTH_CHECKS': True,
+        'DISABLE_SERVER_SIDE_CURSORS': os.environ.get('FORUM_DB_POOLER') == 'pgbouncer',
+        'OPTIONS': {
+            'connect_timeout': env_int('FORUM_DB_CONNECT_TIMEOUT', 5),
+        },
+    }
+
+
+def database_config(base_dir):
+    engine = os.environ.get('FORUM_DB_ENGINE', 'sqlite')
+    if engine == 'postgres':
+        return postgres_config()
+    if engine == 'sqlite':
+        return sqlite_config(base_dir)
+    raise ValueError(f'Unknown FORUM_DB_ENGINE {engine!r}')
+
+
+def sqlite_journal_mode():
+    return os.environ.get('FORUM_DB_JOURNAL_MODE', 'WAL')
+
+
+def sqlite_pragmas():
+    return {
+        'busy_timeout': env_int('FORUM_DB_BUSY_TIMEOUT_MS', 5000),
+        'synchronous': os.environ.get('FORUM_DB_SYNCHRONOUS', 'NORMAL'),
+    }
@@ -13,6 +13,8 @@ import os
 from pathlib import Path
 from datetime import timedelta
 
+from .database import database_config, sqlite_journal_mode, sqlite_pragmas
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -46,6 +48,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'app.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
@@ -58,12 +61,18 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = 'forum.urls'
 
+# 'cached' compiles every template once per process (runserver still picks up edits), 'reload'
+# reads and compiles it again on each render
+TEMPLATE_LOADING = os.environ.get('FORUM_TEMPLATE_LOADING', 'cached')
+TEMPLATE_LOADERS = ['django.template.loaders.filesystem.Loader', 'django.template.loaders.app_directories.Loader']
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': ([('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)]
+                        if TEMPLATE_LOADING == 'cached' else TEMPLATE_LOADERS),
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -80,12 +89,14 @@ WSGI_APPLICATION = 'forum.wsgi.application'
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+    'default': database_config(BASE_DIR),
 }
 
+# Applied by app.signals to every new SQLite connection
+SQLITE_PRAGMAS = sqlite_pragmas()
+# Stored in the database file itself, so it is set once by migration 0015 rather than per connection
+SQLITE_JOURNAL_MODE = sqlite_journal_mode()
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -130,13 +141,19 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'app.CustomUser'
 
+# 'claims' builds request.user from the access token without a query; 'database' loads CustomUser per request
+JWT_AUTH_MODE = os.environ.get('FORUM_JWT_AUTH_MODE', 'claims')
+
 REST_FRAMEWORK = {
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    )
+        'app.auth.ClaimsJWTAuthentication' if JWT_AUTH_MODE == 'claims' else 'app.auth.DatabaseJWTAuthentication',
+    ),
+    # Reverse proxies in front of the app; X-Forwarded-For is only trusted that many hops deep, so
+    # clients can't pick their own address for the per-IP throttles
+    'NUM_PROXIES': int(os.environ.get('FORUM_NUM_PROXIES', 0)),
 }
 
 SIMPLE_JWT = {
@@ -163,7 +180,7 @@ SIMPLE_JWT = {
 
     "AUTH_TOKEN_CLASSES": ("rest_framework_simplejwt.tokens.AccessToken",),
     "TOKEN_TYPE_CLAIM": "token_type",
-    "TOKEN_USER_CLASS": "rest_framework_simplejwt.models.TokenUser",
+    "TOKEN_USER_CLASS": "app.auth.ClaimsUser",
 
     "JTI_CLAIM": "jti",
 
@@ -171,20 +188,105 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_LIFETIME": timedelta(minutes=5),
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=1),
 
-    "TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainPairSerializer",
-    "TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSerializer",
+    "TOKEN_OBTAIN_SERIALIZER": "app.auth.ForumTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "app.auth.ForumTokenRefreshSerializer",
     "TOKEN_VERIFY_SERIALIZER": "rest_framework_simplejwt.serializers.TokenVerifySerializer",
     "TOKEN_BLACKLIST_SERIALIZER": "rest_framework_simplejwt.serializers.TokenBlacklistSerializer",
     "SLIDING_TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainSlidingSerializer",
     "SLIDING_TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSlidingSerializer",
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Holds nothing but throttle buckets, so resetting them can't touch revocations or cached pages
+    'throttle': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'throttle',
+    },
+}
+
+# Rendered pages for topic lists, topic details, news and comment threads; 0 disables it
+RESPONSE_CACHE_ALIAS = 'default'
+RESPONSE_CACHE_TIMEOUT = 300
+
+NEWS_CATEGORY_ID = 1
+
+# Upper bounds (and defaults) for the ?depth= and ?replies= parameters of comment tree views
+COMMENT_TREE_MAX_DEPTH = 8
+COMMENT_TREE_REPLIES = 20
+
+# Comment threads: 'fragments' renders each comment once per version and reuses the cached HTML,
+# 'template' renders the whole thread through comments.html on every request
+COMMENT_RENDER_MODE = os.environ.get('FORUM_COMMENT_RENDER_MODE', 'fragments')
+COMMENT_FRAGMENT_CACHE_ALIAS = 'default'
+COMMENT_FRAGMENT_CACHE_TIMEOUT = 60 * 60
+
+# Live topic updates: 'app.events.InProcessBroker' for one process, 'app.events.RedisBroker' across several
+EVENT_BROKER = os.environ.get('FORUM_EVENT_BROKER', 'app.events.InProcessBroker')
+EVENT_BROKER_URL = os.environ.get('FORUM_EVENT_BROKER_URL', 'redis://localhost:6379/0')
+EVENT_STREAM_HEARTBEAT = 15
+
+# Category listings: 'cursor' pages by (created_at, id), 'page' keeps PageNumberPagination
+TOPIC_PAGINATION_MODE = 'cursor'
+# 'exact', 'cached', 'counter' (Category.topic_count) or None to leave the count out of cursor pages
+TOPIC_COUNT_MODE = 'counter'
+TOPIC_COUNT_CACHE_TIMEOUT = 60
+
+# Changing this list requires `manage.py render_topic_content` to refresh Topic.content_html
+MARKDOWN_EXTENSIONS = ['extra', 'sane_lists']
+
+# Revoked tokens are kept here; it has to be shared by every process (Redis, memcached) in production
+AUTH_REVOCATION_CACHE_ALIAS = 'default'
+# Per-process cache of full users for ClaimsUser attributes that aren't in the token
+AUTH_USER_CACHE_TTL = 30
+AUTH_USER_CACHE_SIZE = 10000
+
+# Trending topics: every comment adds COMMENT_WEIGHT and every like LIKE_WEIGHT to Topic.hot_score, which
+# `manage.py decay_hot_scores` halves every HALF_LIFE_HOURS; scores that decay below FLOOR drop to 0
+HOT_SCORE_COMMENT_WEIGHT = 1.0
+HOT_SCORE_LIKE_WEIGHT = 0.5
+HOT_SCORE_HALF_LIFE_HOURS = 24
+HOT_SCORE_FLOOR = 0.01
+
+# Token buckets for the write endpoints, per throttle scope and per user / client IP: `burst`
+# requests at once, refilled at `per_minute`. 'app.throttles.CacheBuckets' shares them across
+# processes through THROTTLE_CACHE_ALIAS, which must be a cache of its own; an empty dict turns throttling off.
+THROTTLE_BACKEND = os.environ.get('FORUM_THROTTLE_BACKEND', 'app.throttles.MemoryBuckets')
+THROTTLE_CACHE_ALIAS = 'throttle'
+THROTTLE_MEMORY_BUCKETS = 100000
+THROTTLE_BUCKETS = {
+    'like': {'user': {'burst': 30, 'per_minute': 60}, 'ip': {'burst': 120, 'per_minute': 240}},
+    'comment': {'user': {'burst': 10, 'per_minute': 10}, 'ip': {'burst': 40, 'per_minute': 60}},
+}
+
+# Most comments a single POST to comments/likes/ may change
+LIKE_BATCH_SIZE = 200
+# How long a user's liked comments per topic stay cached; liking or unliking clears it
+LIKED_COMMENTS_CACHE_TIMEOUT = 300
+
+# Requests slower than this are logged with their SQL; None turns the SQL capture off
+METRICS_SLOW_REQUEST_MS = 500
+# Scrapers send it as "Authorization: Bearer <token>"; with no token set the endpoint is closed
+METRICS_TOKEN = os.environ.get('FORUM_METRICS_TOKEN')
+
 
 DEFAULT_FILE_STORAGE = 'django.core.files.storage.FileSystemStorage'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Profile picture variants (widths in px), written as WebP under MEDIA_ROOT/AVATAR_DIR by AVATAR_WORKERS
+# background threads; 0 workers processes uploads inline
+AVATAR_SIZES = [64, 128, 256]
+AVATAR_QUALITY = 80
+AVATAR_DIR = 'avatars'
+AVATAR_WORKERS = 2
+AVATAR_MAX_UPLOAD_BYTES = 5 * 1024 * 1024
+# Width x height limit checked before a picture is decoded; small files can still expand to huge bitmaps
+AVATAR_MAX_PIXELS = 24_000_000
+
 CORS_ALLOW_ALL_ORIGINS = False
 
 CORS_ALLOWED_ORIGINS = [
@@ -3,6 +3,11 @@ from django.urls import path
 
 from app.views import LogoutView, TopicCreateView, TopicListView, TopicDetailView, CommentsView
 from app.views import LatestNewsView, UserInfoView, UserRegistrationView, CreateCommentView, LikeCommentView
+from app.views import ResponseCacheStatsView, CommentTreeView, CommentRepliesView, SearchView
+from app.views import MetricsView, LikeBatchView, ProfilePictureView, AvatarView, TrendingTopicsView
+from app.views import CategoryListView
+from app.async_views import AsyncTopicListView, AsyncTopicDetailView, AsyncTopicPageView
+from app.async_views import AsyncLatestNewsView, AsyncCommentsView, TopicEventsView
 
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
@@ -18,14 +23,32 @@ urlpatterns = [
     path('api/token/verify/', TokenVerifyView.as_view(), name='token_verify'),
     path('profile/', UserInfoView.as_view(), name='profile-page'),
     path('profile/<int:user_id>/', UserInfoView.as_view(), name='others-profile-page'),
+    path('profile/picture/', ProfilePictureView.as_view(), name='profile-picture'),
     path('logout/', LogoutView.as_view(), name='logout'),
     path('topic/create/', TopicCreateView.as_view(), name='create_topic'),
     path('topics/', TopicListView.as_view(), name='topic-list'),
     path('topics/<int:pk>/', TopicDetailView.as_view(), name='topic-detail'),
     path('topics/category/<int:category_pk>/', TopicListView.as_view(), name='topic-list-by-category'),
+    path('categories/', CategoryListView.as_view(), name='category-list'),
     path('news/last/', LatestNewsView.as_view(), name='last-news'),
+    path('topics/trending/', TrendingTopicsView.as_view(), name='trending-topics'),
+    path('topics/trending/category/<int:category_pk>/', TrendingTopicsView.as_view(), name='trending-topics-by-category'),
     path('comments/create/<int:topic_id>/', CreateCommentView.as_view(), name='create_comment'),
     path('comments/create/<int:topic_id>/<int:parent_id>/', CreateCommentView.as_view(), name='reply_comment'),
     path('comments/topic/<int:topic_id>/', CommentsView.as_view(), name='topic_comments'),
+    path('comments/topic/<int:topic_id>/tree/', CommentTreeView.as_view(), name='topic_comment_tree'),
+    path('comments/<int:comment_id>/replies/', CommentRepliesView.as_view(), name='comment_replies'),
     path('comments/<int:comment_id>/like/', LikeCommentView.as_view(), name='like_comment'),
+    path('comments/likes/', LikeBatchView.as_view(), name='like_comments'),
+    path('async/topics/', AsyncTopicListView.as_view(), name='async-topic-list'),
+    path('async/topics/<int:pk>/', AsyncTopicDetailView.as_view(), name='async-topic-detail'),
+    path('async/topics/<int:pk>/page/', AsyncTopicPageView.as_view(), name='async-topic-page'),
+    path('async/topics/category/<int:category_pk>/', AsyncTopicListView.as_view(), name='async-topic-list-by-category'),
+    path('async/news/last/', AsyncLatestNewsView.as_view(), name='async-last-news'),
+    path('async/comments/topic/<int:topic_id>/', AsyncCommentsView.as_view(), name='async-topic-comments'),
+    path('events/topic/<int:topic_id>/', TopicEventsView.as_view(), name='topic-events'),
+    path('search/', SearchView.as_view(), name='search'),
+    path('stats/cache/', ResponseCacheStatsView.as_view(), name='response-cache-stats'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
+    path('media/avatars/<str:name>', AvatarView.as_view(), name='avatar'),
 ]